@@ -0,0 +1,84 @@
+"""Run the benchmark suite and compare it against a saved baseline.
+
+Run from project root:
+    python -m bench                       # run all, write bench_results.json
+    python -m bench --save-baseline       # also store results as the baseline
+    python -m bench -k trust --repeat 10  # only benchmarks whose name has "trust"
+
+Exits non-zero when any benchmark's median is more than --threshold slower
+than the baseline.
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+# Benchmarks never reach OpenAI, but the client module needs a key to import.
+os.environ.setdefault("OPENAI_API_KEY", "bench-unused")
+# Configure logging before main.py does, so its DEBUG file handler isn't installed.
+logging.basicConfig(level=logging.WARNING)
+
+from bench import harness  # noqa: E402
+from bench import bench_hot_path, bench_reply_latency  # noqa: E402,F401
+
+_DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__)
+    parser.add_argument(
+        "-k", "--filter", default="", help="substring of benchmark names to run"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="seconds per repeat"
+    )
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=_DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10, help="allowed slowdown, 0.10 = 10%%"
+    )
+    args = parser.parse_args(argv)
+
+    names = harness.registered(args.filter)
+    if not names:
+        print(f"No benchmarks match {args.filter!r}", file=sys.stderr)
+        return 2
+
+    baseline = harness.load(args.baseline) if os.path.exists(args.baseline) else None
+    base_results = baseline["results"] if baseline else {}
+
+    results = []
+    for name in names:
+        result = harness.run_one(name, repeat=args.repeat, min_time=args.min_time)
+        results.append(result)
+        spread = result.stdev_s / result.median_s
+        line = f"{name:55s} {harness.format_seconds(result.median_s)}  ±{spread:5.1%}"
+        if name in base_results:
+            ratio = result.median_s / base_results[name]["median_s"]
+            line += f"  ({ratio:.2f}x baseline)"
+        print(line, flush=True)
+
+    harness.save(args.output, results)
+    print(f"\nResults written to {args.output}")
+    if args.save_baseline:
+        harness.save(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if baseline:
+        regressions = harness.compare(results, baseline, args.threshold)
+        for name, base_s, cur_s, ratio in regressions:
+            print(
+                f"REGRESSION {name}: {harness.format_seconds(base_s).strip()} -> "
+                f"{harness.format_seconds(cur_s).strip()} ({ratio:.2f}x)"
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
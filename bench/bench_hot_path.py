@@ -0,0 +1,155 @@
+"""CPU-side hot spots on the path of every incoming message."""
+
+from fastapi import BackgroundTasks
+
+from bench import fakes
+from bench.harness import benchmark
+from config import settings
+from database import firebase, local_store, models
+from integrations import openai_client
+from services import (
+    conversation_service,
+    fast_path_service,
+    number_registry,
+    outbound_payloads,
+    trust_service,
+)
+
+_BENCH_PHONE_NUMBER_ID = "100000000000001"
+_HISTORY_SIZES = (10, 100, 1000)
+
+
+def _webhook_case(n_messages: int):
+    def setup():
+        main = fakes.load_main()
+        main.whatsapp_numbers = {
+            _BENCH_PHONE_NUMBER_ID: number_registry.WhatsAppNumber(
+                phone_number_id=_BENCH_PHONE_NUMBER_ID,
+                access_token="bench-unused",
+                flow_id_en="1",
+                flow_id_pt="2",
+            )
+        }
+        request = fakes.FakeRequest(
+            fakes.webhook_payload(_BENCH_PHONE_NUMBER_ID, n_messages)
+        )
+
+        async def run():
+            await main.handle_webhook(request, BackgroundTasks())
+
+        return run
+
+    return setup
+
+
+benchmark("webhook.parse_envelope.1_message")(_webhook_case(1))
+benchmark("webhook.parse_envelope.20_messages")(_webhook_case(20))
+
+
+def _conversation_model_case(n_messages: int):
+    def setup():
+        data = fakes.conversation_doc(n_messages)
+        data["phone_number"] = "5511999000000"
+        return lambda: models.Conversation(**data)
+
+    return setup
+
+
+for _n in _HISTORY_SIZES:
+    benchmark(f"conversation.model_construct.{_n}_messages")(
+        _conversation_model_case(_n)
+    )
+
+
+# Only the last few turns go to the LLM, so history length doesn't matter here.
+@benchmark("conversation.build_llm_request")
+def _llm_request():
+    data = fakes.conversation_doc(100)
+    conversation = models.Conversation(phone_number="5511999000000", **data)
+    text = "What do you think about the voting machine?"
+    return lambda: conversation_service._build_prompt_prefix(
+        conversation
+    ) + conversation_service._build_llm_messages(conversation, text)
+
+
+@benchmark("firebase.conversation_doc_id")
+def _conversation_doc_id():
+    return lambda: firebase.conversation_doc_id("5511999990000")
+
+
+@benchmark("trust.parse_text_rating.valid")
+def _parse_text_valid():
+    return lambda: trust_service.parse_text_rating(" 7 ")
+
+
+@benchmark("trust.parse_text_rating.invalid")
+def _parse_text_invalid():
+    return lambda: trust_service.parse_text_rating("I don't know")
+
+
+@benchmark("trust.parse_interactive_rating")
+def _parse_interactive():
+    return lambda: trust_service.parse_interactive_rating("rating_7")
+
+
+def _trust_prompt_case(use_flows: bool):
+    def setup():
+        settings.USE_FLOWS = use_flows
+        return lambda: trust_service.get_trust_prompt("PT", "check_in")
+
+    return setup
+
+
+benchmark("trust.get_trust_prompt.text_mode")(_trust_prompt_case(False))
+benchmark("trust.get_trust_prompt.flow_mode")(_trust_prompt_case(True))
+
+
+def _trust_payload_case(use_flows: bool):
+    def setup():
+        settings.USE_FLOWS = use_flows
+        number = number_registry.WhatsAppNumber(
+            _BENCH_PHONE_NUMBER_ID, "token", "1", "2"
+        )
+        outbound_payloads.precompute([number])
+        return lambda: outbound_payloads.trust_prompt(number, "PT", "check_in").render(
+            "5511999000000"
+        )
+
+    return setup
+
+
+benchmark("outbound.trust_prompt_body.text_mode")(_trust_payload_case(False))
+benchmark("outbound.trust_prompt_body.flow_mode")(_trust_payload_case(True))
+
+
+@benchmark("fast_path.classify.no_match")
+def _fast_path_no_match():
+    history = [models.Message(**m) for m in fakes.make_history(10)]
+    return lambda: fast_path_service.classify(
+        "What do you think about the voting machine?", history
+    )
+
+
+@benchmark("conversation.handle_incoming_message.normal")
+def _handle_incoming_message():
+    """Full normal-phase turn against the in-memory store and a fake LLM.
+
+    The conversation document is restored before every call so the history
+    doesn't grow across iterations; that reset is included in the timing, as
+    are the write-behind writes the turn returns (applied inline here).
+    """
+    openai_client.get_completion = fakes.fake_completion
+    client = local_store.LocalClient()
+    phone_number = "5511999000000"
+    doc_ref = firebase.conversation_ref(client, phone_number)
+    seed = fakes.conversation_doc(10)
+
+    async def run():
+        doc_ref.set(seed)
+        response = await conversation_service.handle_incoming_message(
+            client, phone_number, "What do you think about the voting machine?", "text"
+        )
+        for write in response.pending_writes:
+            write()
+
+    return run
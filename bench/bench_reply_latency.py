@@ -0,0 +1,84 @@
+"""User-perceived latency of a full turn with simulated network latencies.
+
+Runs process_whatsapp_ai end to end against a LocalClient whose document
+reads/writes block like Firestore RPCs, with fake Graph, Whisper and LLM calls
+that sleep for typical durations. Each case reports the time from the start of
+processing to the moment the reply is handed to the Graph API, which is what
+the user waits for; persistence finishing afterwards isn't counted.
+"""
+
+import asyncio
+import time
+
+from bench import fakes
+from bench.harness import benchmark
+from database import firebase, local_store
+from integrations import openai_client
+from services import number_registry, transcription_service
+
+FIRESTORE_RPC_S = 0.030
+MEDIA_METADATA_S = 0.030
+MEDIA_DOWNLOAD_S = 0.060
+WHISPER_S = 0.300
+LLM_S = 0.600
+GRAPH_SEND_S = 0.060
+
+_NUMBER = number_registry.WhatsAppNumber(
+    phone_number_id="100000000000001",
+    access_token="bench-unused",
+    flow_id_en="1",
+    flow_id_pt="2",
+)
+_PHONE = "5511999000000"
+
+
+def _reply_latency_case(msg_type: str):
+    def setup():
+        client = local_store.LocalClient(latency=FIRESTORE_RPC_S)
+        main = fakes.load_main(client)
+        main.firestore_client = client
+        seed = fakes.conversation_doc(10)
+        reply_sent_at = []
+
+        async def fake_llm(messages, cache_key=None):
+            await asyncio.sleep(LLM_S)
+            return await fakes.fake_completion(messages, cache_key)
+
+        async def fake_whisper(audio_bytes):
+            await asyncio.sleep(WHISPER_S)
+            return "I don't really trust the voting machines."
+
+        async def fake_download(number, media_id):
+            await asyncio.sleep(MEDIA_METADATA_S + MEDIA_DOWNLOAD_S)
+            return b"OggS fake voice note"
+
+        async def fake_send(number, to_phone, text):
+            reply_sent_at.append(time.perf_counter())
+            await asyncio.sleep(GRAPH_SEND_S)
+
+        openai_client.get_completion = fake_llm
+        openai_client.transcribe_audio = fake_whisper
+        main.download_whatsapp_audio = fake_download
+        main.send_message_to_whatsapp = fake_send
+
+        async def run() -> float:
+            client.latency = 0
+            firebase.conversation_ref(client, _PHONE).set(seed)
+            client.latency = FIRESTORE_RPC_S
+            transcription_service._cache.clear()
+            reply_sent_at.clear()
+
+            message = "media-1" if msg_type == "audio" else "I don't trust them."
+            started = time.perf_counter()
+            await main.process_whatsapp_ai(_NUMBER, _PHONE, message, msg_type)
+            elapsed = reply_sent_at[0] - started
+            await fakes.drain_background_writes(main)
+            return elapsed
+
+        return run
+
+    return setup
+
+
+benchmark("reply_latency.text_turn", self_timed=True)(_reply_latency_case("text"))
+benchmark("reply_latency.voice_turn", self_timed=True)(_reply_latency_case("audio"))
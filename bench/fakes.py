@@ -0,0 +1,111 @@
+"""Fixtures for benchmarks: in-memory Firestore, fake LLM, sample payloads."""
+
+import importlib
+from datetime import datetime, timezone
+
+from database import firebase, local_store, write_behind
+from integrations import openai_client
+
+FAKE_AI_REPLY = (
+    "That's a fair question. Brazil's electronic voting machines have been "
+    "audited many times — what makes you doubt them?"
+)
+
+
+class FakeRequest:
+    """Just enough of starlette's Request for handle_webhook."""
+
+    def __init__(self, payload: dict):
+        self._payload = payload
+
+    async def json(self) -> dict:
+        return self._payload
+
+
+async def fake_completion(
+    messages: list[dict], cache_key: str | None = None
+) -> openai_client.Completion:
+    return openai_client.Completion(
+        text=FAKE_AI_REPLY, prompt_tokens=1200, completion_tokens=40, cached_tokens=1024
+    )
+
+
+def load_main(client=None):
+    """Import main.py against a local store instead of a real Firestore project."""
+    firebase.init_firestore = lambda: client or local_store.LocalClient()
+    return importlib.import_module("main")
+
+
+def make_history(n_messages: int) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message number {i} about the electronic voting system. " * 3,
+            "timestamp": now,
+        }
+        for i in range(n_messages)
+    ]
+
+
+def conversation_doc(
+    n_messages: int, phase: str = "normal", language: str = "PT"
+) -> dict:
+    """A conversation document as stored in Firestore (no phone_number key)."""
+    now = datetime.now(timezone.utc)
+    return {
+        "last_message": "Message",
+        "history": make_history(n_messages),
+        "updated_at": now,
+        "language": language,
+        "prompt_variant": f"{language}_prompt_A_control_condition",
+        "conversation_phase": phase,
+        "feeling_array": [{"score": 5, "timestamp": now, "message_index": 0}],
+        "user_turn_count": 0,
+        "intro_sent": True,
+        "pending_ai_response": "",
+    }
+
+
+def webhook_payload(phone_number_id: str, n_messages: int = 1) -> dict:
+    """A full Meta webhook envelope carrying `n_messages` text messages."""
+    messages = [
+        {
+            "from": f"5511999{i:06d}",
+            "id": f"wamid.HBgM{i:020d}",
+            "timestamp": "1767225600",
+            "type": "text",
+            "text": {"body": f"Is the voting machine secure? ({i})"},
+        }
+        for i in range(n_messages)
+    ]
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {
+                "id": "102290129340398",
+                "changes": [
+                    {
+                        "field": "messages",
+                        "value": {
+                            "messaging_product": "whatsapp",
+                            "metadata": {
+                                "display_phone_number": "15550783881",
+                                "phone_number_id": phone_number_id,
+                            },
+                            "contacts": [
+                                {"profile": {"name": "Bench"}, "wa_id": m["from"]}
+                                for m in messages
+                            ],
+                            "messages": messages,
+                        },
+                    }
+                ],
+            }
+        ],
+    }
+
+
+async def drain_background_writes(main):
+    """Wait for persistence that process_whatsapp_ai left running, if any."""
+    await write_behind.flush()
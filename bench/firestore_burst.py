@@ -0,0 +1,111 @@
+"""Burst write throughput for new conversations, raw vs hashed document IDs.
+
+Simulates a sign-up burst from one cohort: N brand-new conversations for
+sequential Brazilian numbers (+55 11 9xxxx-xxxx) written concurrently, once
+per key scheme. Write hotspotting is a server-side effect, so run it against a
+real Firestore project (it writes to the "bench_conversations" collection and
+deletes its documents afterwards):
+
+    python -m bench.firestore_burst --docs 2000 --concurrency 64
+    python -m bench.firestore_burst --local   # smoke-test against the local store
+
+Firestore spreads load by splitting hot key ranges over time, so bursts of a
+few thousand writes at high concurrency show the difference best. Alongside
+throughput it reports key dispersion: the largest share of documents that
+fall in any of the 16 leading-character ranges (1/16 = 6.25% is perfectly
+even).
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import json
+import logging
+import statistics
+import sys
+import time
+
+from config import settings
+from database import firebase, local_store, models
+
+logger = logging.getLogger(__name__)
+
+
+def _phone_numbers(count: int, start: int) -> list[str]:
+    return [f"55119{start + i:08d}" for i in range(count)]
+
+
+def _dispersion(doc_ids: list[str]) -> float:
+    buckets = collections.Counter(doc_id[0] for doc_id in doc_ids)
+    return max(buckets.values()) / len(doc_ids)
+
+
+def run_burst(client, scheme: str, docs: int, concurrency: int, start: int) -> dict:
+    settings.CONVERSATION_KEY_SCHEME = scheme
+    phones = _phone_numbers(docs, start)
+    payload = models.Conversation(
+        phone_number="", last_message="", history=[]
+    ).to_firestore()
+
+    def write(phone_number: str) -> float:
+        began = time.perf_counter()
+        firebase.conversation_ref(client, phone_number).set(
+            {**payload, "phone_number": phone_number}
+        )
+        return time.perf_counter() - began
+
+    began = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(write, phones))
+    elapsed = time.perf_counter() - began
+
+    doc_ids = [firebase.conversation_doc_id(p) for p in phones]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda p: firebase.conversation_ref(client, p).delete(), phones))
+
+    return {
+        "scheme": scheme,
+        "docs": docs,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "writes_per_s": docs / elapsed,
+        "latency_p50_s": statistics.median(latencies),
+        "latency_p95_s": latencies[int(len(latencies) * 0.95) - 1],
+        "max_bucket_share": _dispersion(doc_ids),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.firestore_burst")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--scheme", choices=("raw", "hashed", "both"), default="both")
+    parser.add_argument("--local", action="store_true", help="use the in-memory store")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    base = local_store.LocalClient() if args.local else firebase.init_firestore()
+    client = firebase.namespaced(base, "bench")
+
+    schemes = ("raw", "hashed") if args.scheme == "both" else (args.scheme,)
+    results = []
+    for i, scheme in enumerate(schemes):
+        # Fresh numbers per run so the second scheme doesn't reuse warm keys.
+        result = run_burst(client, scheme, args.docs, args.concurrency, i * args.docs)
+        results.append(result)
+        print(
+            f"{scheme:7s} {result['writes_per_s']:9.1f} writes/s  "
+            f"p50 {result['latency_p50_s'] * 1000:7.1f} ms  "
+            f"p95 {result['latency_p95_s'] * 1000:7.1f} ms  "
+            f"max key-range share {result['max_bucket_share']:.1%}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"local": args.local, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Minimal benchmark registry, timer and JSON baseline comparison.
+
+A benchmark is a setup function registered with @benchmark. Setup runs once
+and returns the callable to time (sync or async). Each case is calibrated so
+one repeat takes at least `min_time` seconds, then timed `repeat` times; the
+per-call median is what gets compared against a baseline.
+
+Cases registered with self_timed=True time themselves: the callable returns
+the seconds to count, so setup/teardown inside a call (or work left running
+after the measured point) doesn't pollute the result.
+"""
+
+import asyncio
+import inspect
+import json
+import platform
+import statistics
+import subprocess
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+_registry: dict[str, tuple[Callable[[], Callable], bool]] = {}
+
+
+def benchmark(name: str, self_timed: bool = False):
+    """Register `setup` under `name`. `setup()` returns the callable to time."""
+
+    def decorator(setup: Callable[[], Callable]):
+        if name in _registry:
+            raise ValueError(f"Duplicate benchmark name: {name}")
+        _registry[name] = (setup, self_timed)
+        return setup
+
+    return decorator
+
+
+def registered(name_filter: str = "") -> list[str]:
+    return [name for name in _registry if name_filter in name]
+
+
+@dataclass
+class Result:
+    name: str
+    iterations: int
+    repeats: int
+    median_s: float
+    min_s: float
+    mean_s: float
+    stdev_s: float
+
+
+def _timer(fn: Callable, self_timed: bool) -> Callable[[int], float]:
+    """Return `time_n(n)` that calls `fn` n times and returns elapsed seconds."""
+    if self_timed and inspect.iscoroutinefunction(fn):
+
+        async def _run_self_timed(n: int) -> float:
+            return sum([await fn() for _ in range(n)])
+
+        return lambda n: asyncio.run(_run_self_timed(n))
+
+    if self_timed:
+        return lambda n: sum(fn() for _ in range(n))
+
+    if inspect.iscoroutinefunction(fn):
+
+        async def _run(n: int) -> float:
+            start = time.perf_counter()
+            for _ in range(n):
+                await fn()
+            return time.perf_counter() - start
+
+        return lambda n: asyncio.run(_run(n))
+
+    def _time_sync(n: int) -> float:
+        start = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return time.perf_counter() - start
+
+    return _time_sync
+
+
+def run_one(name: str, repeat: int = 5, min_time: float = 0.2) -> Result:
+    setup, self_timed = _registry[name]
+    time_n = _timer(setup(), self_timed)
+
+    # Calibrate like timeit.autorange: grow n until one repeat is long enough.
+    n = 1
+    while True:
+        elapsed = time_n(n)
+        if elapsed >= min_time or n >= 10_000_000:
+            break
+        n *= 2 if elapsed > min_time / 10 else 10
+
+    per_call = [time_n(n) / n for _ in range(repeat)]
+    return Result(
+        name=name,
+        iterations=n,
+        repeats=repeat,
+        median_s=statistics.median(per_call),
+        min_s=min(per_call),
+        mean_s=statistics.fmean(per_call),
+        stdev_s=statistics.stdev(per_call) if repeat > 1 else 0.0,
+    )
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def to_json(results: list[Result]) -> dict:
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": {r.name: asdict(r) for r in results},
+    }
+
+
+def save(path: str, results: list[Result]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_json(results), f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(
+    results: list[Result], baseline: dict, threshold: float
+) -> list[tuple[str, float, float, float]]:
+    """Return (name, baseline_s, current_s, ratio) for regressions past threshold.
+
+    `ratio` is current / baseline median; threshold 0.10 flags anything more
+    than 10% slower. Benchmarks missing from the baseline are skipped.
+    """
+    regressions = []
+    base_results = baseline.get("results", {})
+    for r in results:
+        base = base_results.get(r.name)
+        if not base or not base.get("median_s"):
+            continue
+        ratio = r.median_s / base["median_s"]
+        if ratio > 1 + threshold:
+            regressions.append((r.name, base["median_s"], r.median_s, ratio))
+    return regressions
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.0f} ns"
@@ -10,6 +10,10 @@ class Settings:
     FIREBASE_CREDS_PATH = os.getenv("FIREBASE_CREDS_PATH")
     FIREBASE_CREDS_JSON = os.getenv("FIREBASE_CREDS_JSON")
     PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
+    # Serve several numbers from one process: a JSON list (or a file holding
+    # one) of per-number settings. See services/number_registry.py.
+    WHATSAPP_NUMBERS = os.getenv("WHATSAPP_NUMBERS")
+    WHATSAPP_NUMBERS_FILE = os.getenv("WHATSAPP_NUMBERS_FILE")
     WHATSAPP_BUSINESS_ACC_ID = os.getenv("WHATSAPP_BUSINESS_ACC_ID")
     ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -18,6 +22,42 @@ class Settings:
     USE_FLOWS = os.getenv("USE_FLOWS", "false").lower() == "true"
     FLOW_ID_EN = os.getenv("FLOW_ID_EN", "123")
     FLOW_ID_PT = os.getenv("FLOW_ID_PT", "123")
+    # Total time budget for one incoming message, shared by every network call.
+    MESSAGE_DEADLINE_SECONDS = float(os.getenv("MESSAGE_DEADLINE_SECONDS", "60"))
+    # Extra time allowed to send the "please try again" reply once it's spent.
+    DEADLINE_GRACE_SECONDS = float(os.getenv("DEADLINE_GRACE_SECONDS", "10"))
+    # Conversation writes run after the reply is sent; attempts and per-attempt budget.
+    WRITE_BEHIND_ATTEMPTS = int(os.getenv("WRITE_BEHIND_ATTEMPTS", "3"))
+    WRITE_BEHIND_TIMEOUT_SECONDS = float(
+        os.getenv("WRITE_BEHIND_TIMEOUT_SECONDS", "10")
+    )
+    # Log event-loop stalls longer than this; 0 disables the monitor.
+    LOOP_STALL_THRESHOLD_MS = int(os.getenv("LOOP_STALL_THRESHOLD_MS", "250"))
+    # Pre-LLM fast path: rules that answer from a template instead of the LLM.
+    FAST_PATH_RULES = os.getenv("FAST_PATH_RULES", "empty,no_content,digits,duplicate")
+    FAST_PATH_DUPLICATE_MIN_WORDS = int(os.getenv("FAST_PATH_DUPLICATE_MIN_WORDS", "3"))
+    FAST_PATH_DUPLICATE_WINDOW_SECONDS = float(
+        os.getenv("FAST_PATH_DUPLICATE_WINDOW_SECONDS", "600")
+    )
+    FAST_PATH_SIMILARITY = float(os.getenv("FAST_PATH_SIMILARITY", "0.9"))
+    # "hashed" spreads conversation document IDs to avoid write hotspots;
+    # "raw" keys them by the bare phone number (pre-migration layout).
+    CONVERSATION_KEY_SCHEME = os.getenv("CONVERSATION_KEY_SCHEME", "hashed")
+    # Look for a legacy raw-ID document whenever a hashed one is missing. Costs
+    # an extra read per new conversation; turn off once the backfill has run.
+    CONVERSATION_KEY_MIGRATE_ON_READ = (
+        os.getenv("CONVERSATION_KEY_MIGRATE_ON_READ", "true").lower() == "true"
+    )
+    # Voice-note transcripts kept in memory, keyed by media_id and audio hash.
+    TRANSCRIPT_CACHE_SIZE = int(os.getenv("TRANSCRIPT_CACHE_SIZE", "1000"))
+    # Also share transcripts across instances via the Firestore 'transcripts' collection.
+    TRANSCRIPT_CACHE_FIRESTORE = (
+        os.getenv("TRANSCRIPT_CACHE_FIRESTORE", "false").lower() == "true"
+    )
+    # Days a shared transcript is kept (its expires_at; needs a TTL policy).
+    TRANSCRIPT_CACHE_TTL_DAYS = float(os.getenv("TRANSCRIPT_CACHE_TTL_DAYS", "30"))
+    # Shared secret for the /debug endpoints; unset disables them.
+    DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
 
 
 settings = Settings()
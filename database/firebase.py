@@ -1,12 +1,17 @@
 import base64
 import datetime as dt
+import hashlib
 import json
 import logging
 import os
+import re
 
 from google.cloud import firestore
 from google.oauth2 import service_account
 
+import deadline
+from config import settings
+
 from . import models
 
 logger = logging.getLogger(__name__)
@@ -41,8 +46,138 @@ def init_firestore():
         raise
 
 
+class NamespacedClient:
+    """Firestore client whose collections are prefixed with a namespace.
+
+    Lets several WhatsApp numbers share one Firestore project without their
+    conversations colliding: collection("conversations") becomes
+    collection("<namespace>_conversations"). Everything else is delegated.
+    """
+
+    def __init__(self, client, namespace: str):
+        self._client = client
+        self._namespace = namespace
+
+    def collection(self, name: str):
+        return self._client.collection(f"{self._namespace}_{name}")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def namespaced(client, namespace: str):
+    """Returns `client` scoped to `namespace` ("" returns it unchanged)."""
+    return NamespacedClient(client, namespace) if namespace else client
+
+
+_HASHED_ID = re.compile(r"^[0-9a-f]{4}_")
+
+
+def conversation_doc_id(phone_number: str) -> str:
+    """Document ID for a phone number's conversation.
+
+    Raw E.164 numbers from one cohort share long prefixes (e.g. +55 11 9...),
+    which clusters their documents in one key range and hotspots Firestore
+    writes during sign-up bursts. The "hashed" scheme prepends 4 hex chars of
+    the number's SHA-256 so IDs spread evenly but stay readable:
+    "5511999990000" -> "3fa2_5511999990000".
+    """
+    if settings.CONVERSATION_KEY_SCHEME == "raw":
+        return phone_number
+    digest = hashlib.sha256(phone_number.encode()).hexdigest()
+    return f"{digest[:4]}_{phone_number}"
+
+
+def is_legacy_doc_id(doc_id: str) -> bool:
+    """True for documents still keyed by the raw phone number."""
+    return not _HASHED_ID.match(doc_id)
+
+
+def phone_number_from_doc_id(doc_id: str) -> str:
+    """Inverse of conversation_doc_id(), for legacy and hashed IDs alike."""
+    return doc_id if is_legacy_doc_id(doc_id) else doc_id.split("_", 1)[1]
+
+
+def conversation_ref(client, phone_number: str):
+    return client.collection("conversations").document(
+        conversation_doc_id(phone_number)
+    )
+
+
+def migrate_conversation_key(client, phone_number: str) -> bool:
+    """Moves a conversation from its raw phone-number ID to the hashed ID.
+
+    Runs in a transaction so it is safe while live traffic writes to the same
+    conversation. If the hashed document already exists (e.g. an instance
+    still on the raw scheme wrote the legacy one during a rolling deploy), the
+    legacy history and ratings are merged into it before the legacy document
+    is deleted. Returns True if a legacy document was found.
+    """
+    legacy_ref = client.collection("conversations").document(phone_number)
+    new_ref = conversation_ref(client, phone_number)
+    if legacy_ref.id == new_ref.id:
+        return False
+
+    # Plain read first so brand-new users don't pay for a transaction.
+    with deadline.stage("firestore_read") as timeout:
+        if not legacy_ref.get(timeout=timeout).exists:
+            return False
+
+    @firestore.transactional
+    def _txn(transaction, timeout):
+        legacy = legacy_ref.get(transaction=transaction, timeout=timeout)
+        if not legacy.exists:
+            return False
+        current = new_ref.get(transaction=transaction, timeout=timeout)
+        if not current.exists:
+            data = legacy.to_dict()
+            data["phone_number"] = phone_number
+            transaction.set(new_ref, data)
+        else:
+            merged = _merge_timelines(current.to_dict(), legacy.to_dict())
+            if merged:
+                logger.warning(
+                    "Merging legacy conversation into %s (%s)",
+                    new_ref.id,
+                    ", ".join(merged),
+                )
+                transaction.update(new_ref, merged)
+        transaction.delete(legacy_ref)
+        return True
+
+    with deadline.stage("firestore_write") as timeout:
+        return _txn(client.transaction(), timeout)
+
+
+def _merge_timelines(current: dict, legacy: dict) -> dict:
+    """history/feeling_array entries only in `legacy`, merged in time order.
+
+    Returns the fields of `current` that need updating (empty if none).
+    """
+    merged = {}
+    for field in ("history", "feeling_array"):
+        entries = list(current.get(field) or [])
+        missing = [e for e in legacy.get(field) or [] if e not in entries]
+        if missing:
+            merged[field] = sorted(entries + missing, key=_entry_time)
+    return merged
+
+
+def _entry_time(entry: dict) -> dt.datetime:
+    timestamp = entry.get("timestamp") or dt.datetime.min
+    # Firestore stores naive datetimes as UTC.
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=dt.timezone.utc)
+    return timestamp
+
+
 def save_message(
-    client, phone_number: str, message_text: str, role: str = "user"
+    client,
+    phone_number: str,
+    message_text: str,
+    role: str = "user",
+    usage: dict | None = None,
+    entry: dict | None = None,
 ) -> bool:
     """Saves a message to the 'conversations' collection.
 
@@ -51,24 +186,38 @@ def save_message(
         phone_number: User's phone number (document ID)
         message_text: The message content
         role: Either "user" or "assistant"
+        usage: LLM token counts for an assistant message, if any
+        entry: The history element to append, if the caller built it already.
+            Writes that may be retried must pass one: every attempt then sends
+            the same element (same timestamp), and ArrayUnion adds it once
+            even if an earlier attempt committed but timed out.
     """
     try:
-        doc_ref = client.collection("conversations").document(phone_number)
-
-        new_message = models.Message(role=role, content=message_text)
-
-        doc_ref.set(
-            {
-                "last_message": message_text,
-                "updated_at": dt.datetime.now(),
-                "history": firestore.ArrayUnion([new_message.model_dump()]),
-            },
-            merge=True,
-        )
+        doc_ref = conversation_ref(client, phone_number)
+
+        if entry is None:
+            entry = models.Message(
+                role=role, content=message_text, usage=usage
+            ).model_dump(exclude_none=True)
+
+        with deadline.stage("firestore_write") as timeout:
+            doc_ref.set(
+                {
+                    "last_message": message_text,
+                    "updated_at": dt.datetime.now(),
+                    "history": firestore.ArrayUnion([entry]),
+                },
+                merge=True,
+                timeout=timeout,
+            )
 
         return True
+    except deadline.DeadlineExceeded:
+        raise
     except Exception:
-        logger.exception("Error saving message for phone_number=%s role=%s", phone_number, role)
+        logger.exception(
+            "Error saving message for phone_number=%s role=%s", phone_number, role
+        )
         return False
 
 
@@ -82,8 +231,19 @@ def get_or_create_conversation(
 ) -> models.Conversation:
     # check the database for existing conversation
     # if exists return convo.
-    doc_ref = client.collection("conversations").document(phone_number)
-    doc = doc_ref.get()
+    doc_ref = conversation_ref(client, phone_number)
+    with deadline.stage("firestore_read") as timeout:
+        doc = doc_ref.get(timeout=timeout)
+
+    # Conversations created before key hashing move to their new ID on first use.
+    if (
+        not doc.exists
+        and settings.CONVERSATION_KEY_MIGRATE_ON_READ
+        and migrate_conversation_key(client, phone_number)
+    ):
+        logger.info("Migrated conversation key for phone_number=%s", phone_number)
+        with deadline.stage("firestore_read") as timeout:
+            doc = doc_ref.get(timeout=timeout)
 
     if doc.exists:
         logger.info("Returning existing conversation for phone_number=%s", phone_number)
@@ -104,25 +264,41 @@ def get_or_create_conversation(
             prompt_variant=variant,
             history=[],
         )
-        doc_ref.set(convo.to_firestore())
+        with deadline.stage("firestore_write") as timeout:
+            doc_ref.set(convo.to_firestore(), timeout=timeout)
         return convo
 
 
 def save_trust_rating(
-    client, phone_number: str, score: int, message_index: int
+    client,
+    phone_number: str,
+    score: int,
+    message_index: int,
+    rating: dict | None = None,
 ) -> bool:
-    """Appends a trust rating to the feeling_array in Firestore."""
+    """Appends a trust rating to the feeling_array in Firestore.
+
+    Pass a prebuilt `rating` when the write may be retried, for the same
+    reason as save_message()'s `entry`.
+    """
     try:
-        doc_ref = client.collection("conversations").document(phone_number)
-        rating = models.TrustRating(score=score, message_index=message_index)
-        doc_ref.set(
-            {
-                "feeling_array": firestore.ArrayUnion([rating.model_dump()]),
-                "updated_at": dt.datetime.now(),
-            },
-            merge=True,
-        )
+        doc_ref = conversation_ref(client, phone_number)
+        if rating is None:
+            rating = models.TrustRating(
+                score=score, message_index=message_index
+            ).model_dump(exclude_none=True)
+        with deadline.stage("firestore_write") as timeout:
+            doc_ref.set(
+                {
+                    "feeling_array": firestore.ArrayUnion([rating]),
+                    "updated_at": dt.datetime.now(),
+                },
+                merge=True,
+                timeout=timeout,
+            )
         return True
+    except deadline.DeadlineExceeded:
+        raise
     except Exception:
         logger.exception(
             "Error saving trust rating for phone_number=%s message_index=%s",
@@ -137,15 +313,18 @@ def update_conversation_phase(
 ) -> bool:
     """Updates the conversation phase and optionally the turn count."""
     try:
-        doc_ref = client.collection("conversations").document(phone_number)
+        doc_ref = conversation_ref(client, phone_number)
         update_data = {
             "conversation_phase": phase,
             "updated_at": dt.datetime.now(),
         }
         if user_turn_count is not None:
             update_data["user_turn_count"] = user_turn_count
-        doc_ref.update(update_data)
+        with deadline.stage("firestore_write") as timeout:
+            doc_ref.update(update_data, timeout=timeout)
         return True
+    except deadline.DeadlineExceeded:
+        raise
     except Exception:
         logger.exception(
             "Error updating conversation phase for phone_number=%s phase=%s",
@@ -158,24 +337,57 @@ def update_conversation_phase(
 def update_intro_sent(client, phone_number: str) -> bool:
     """Marks the intro as sent for this conversation."""
     try:
-        doc_ref = client.collection("conversations").document(phone_number)
-        doc_ref.update({"intro_sent": True, "updated_at": dt.datetime.now()})
+        doc_ref = conversation_ref(client, phone_number)
+        with deadline.stage("firestore_write") as timeout:
+            doc_ref.update(
+                {"intro_sent": True, "updated_at": dt.datetime.now()}, timeout=timeout
+            )
         return True
+    except deadline.DeadlineExceeded:
+        raise
     except Exception:
         logger.exception("Error updating intro_sent for phone_number=%s", phone_number)
         return False
 
 
+def clear_check_in_source(client, phone_number: str) -> bool:
+    """Removes check_in_source once the check-in it belongs to is answered."""
+    try:
+        doc_ref = conversation_ref(client, phone_number)
+        with deadline.stage("firestore_write") as timeout:
+            doc_ref.update(
+                {
+                    "check_in_source": firestore.DELETE_FIELD,
+                    "updated_at": dt.datetime.now(),
+                },
+                timeout=timeout,
+            )
+        return True
+    except deadline.DeadlineExceeded:
+        raise
+    except Exception:
+        logger.exception(
+            "Error clearing check_in_source for phone_number=%s", phone_number
+        )
+        return False
+
+
 def save_pending_response(client, phone_number: str, ai_response: str) -> bool:
     """Stores an AI response to send after the user completes a check-in rating."""
     try:
-        doc_ref = client.collection("conversations").document(phone_number)
-        doc_ref.update(
-            {"pending_ai_response": ai_response, "updated_at": dt.datetime.now()}
-        )
+        doc_ref = conversation_ref(client, phone_number)
+        with deadline.stage("firestore_write") as timeout:
+            doc_ref.update(
+                {"pending_ai_response": ai_response, "updated_at": dt.datetime.now()},
+                timeout=timeout,
+            )
         return True
+    except deadline.DeadlineExceeded:
+        raise
     except Exception:
-        logger.exception("Error saving pending response for phone_number=%s", phone_number)
+        logger.exception(
+            "Error saving pending response for phone_number=%s", phone_number
+        )
         return False
 
 
@@ -186,11 +398,11 @@ def get_and_clear_pending_response(client, phone_number: str) -> str:
     both read the value before either clears it, preventing double-delivery.
     """
     try:
-        doc_ref = client.collection("conversations").document(phone_number)
+        doc_ref = conversation_ref(client, phone_number)
 
         @firestore.transactional
-        def _txn(transaction, doc_ref):
-            doc = doc_ref.get(transaction=transaction)
+        def _txn(transaction, doc_ref, timeout):
+            doc = doc_ref.get(transaction=transaction, timeout=timeout)
             if not doc.exists:
                 return ""
             pending = doc.to_dict().get("pending_ai_response", "")
@@ -201,24 +413,35 @@ def get_and_clear_pending_response(client, phone_number: str) -> str:
             return pending
 
         transaction = client.transaction()
-        return _txn(transaction, doc_ref)
+        with deadline.stage("firestore_read") as timeout:
+            return _txn(transaction, doc_ref, timeout)
+    except deadline.DeadlineExceeded:
+        raise
     except Exception:
-        logger.exception("Error getting pending response for phone_number=%s", phone_number)
+        logger.exception(
+            "Error getting pending response for phone_number=%s", phone_number
+        )
         return ""
 
 
-def update_language(client, phone_number: str, language: str, prompt_variant: str) -> bool:
+def update_language(
+    client, phone_number: str, language: str, prompt_variant: str
+) -> bool:
     """Updates the language and corresponding prompt variant for a conversation."""
     try:
-        doc_ref = client.collection("conversations").document(phone_number)
-        doc_ref.update(
-            {
-                "language": language,
-                "prompt_variant": prompt_variant,
-                "updated_at": dt.datetime.now(),
-            }
-        )
+        doc_ref = conversation_ref(client, phone_number)
+        with deadline.stage("firestore_write") as timeout:
+            doc_ref.update(
+                {
+                    "language": language,
+                    "prompt_variant": prompt_variant,
+                    "updated_at": dt.datetime.now(),
+                },
+                timeout=timeout,
+            )
         return True
+    except deadline.DeadlineExceeded:
+        raise
     except Exception:
         logger.exception("Error updating language for phone_number=%s", phone_number)
         return False
@@ -226,8 +449,99 @@ def update_language(client, phone_number: str, language: str, prompt_variant: st
 
 def delete_conversation(client, phone_number: str) -> bool:
     try:
-        client.collection("conversations").document(phone_number).delete()
+        with deadline.stage("firestore_write") as timeout:
+            conversation_ref(client, phone_number).delete(timeout=timeout)
+            # Also remove a not-yet-migrated document under the raw number.
+            client.collection("conversations").document(phone_number).delete(
+                timeout=timeout
+            )
+        delete_cached_transcripts(client, phone_number)
         return True
+    except deadline.DeadlineExceeded:
+        raise
     except Exception:
-        logger.exception("Error deleting conversation for phone_number=%s", phone_number)
+        logger.exception(
+            "Error deleting conversation for phone_number=%s", phone_number
+        )
         return False
+
+
+def get_cached_transcript(client, cache_key: str) -> dict | None:
+    """Returns {"transcript", "whisper_seconds", ...} for a cache key, or None.
+
+    Cache misses, expired entries (the TTL policy may not have removed them
+    yet) and read errors all return None; the caller falls back to
+    transcribing the audio.
+    """
+    try:
+        with deadline.stage("firestore_read") as timeout:
+            doc = (
+                client.collection("transcripts")
+                .document(cache_key)
+                .get(timeout=timeout)
+            )
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        expires_at = data.get("expires_at")
+        if expires_at is not None and expires_at <= dt.datetime.now(dt.timezone.utc):
+            return None
+        return data
+    except deadline.DeadlineExceeded:
+        raise
+    except Exception:
+        logger.exception("Error reading cached transcript for key=%s", cache_key)
+        return None
+
+
+def save_cached_transcript(
+    client,
+    cache_key: str,
+    transcript: str,
+    whisper_seconds: float,
+    phone_number: str,
+) -> bool:
+    """Stores a transcript in the shared 'transcripts' cache collection.
+
+    Entries record whose voice note they came from, so deleting that user's
+    data can find them, and an expires_at TRANSCRIPT_CACHE_TTL_DAYS ahead for
+    the collection's Firestore TTL policy.
+    """
+    now = dt.datetime.now(dt.timezone.utc)
+    try:
+        with deadline.stage("firestore_write") as timeout:
+            client.collection("transcripts").document(cache_key).set(
+                {
+                    "transcript": transcript,
+                    "whisper_seconds": whisper_seconds,
+                    "phone_number": phone_number,
+                    "updated_at": now,
+                    "expires_at": now
+                    + dt.timedelta(days=settings.TRANSCRIPT_CACHE_TTL_DAYS),
+                },
+                timeout=timeout,
+            )
+        return True
+    except deadline.DeadlineExceeded:
+        raise
+    except Exception:
+        logger.exception("Error saving cached transcript for key=%s", cache_key)
+        return False
+
+
+def cached_transcripts_query(client, phone_number: str):
+    """The 'transcripts' cache entries made from this user's voice notes."""
+    return client.collection("transcripts").where(
+        filter=firestore.FieldFilter("phone_number", "==", phone_number)
+    )
+
+
+def delete_cached_transcripts(client, phone_number: str) -> int:
+    """Deletes this user's entries from the shared transcript cache."""
+    with deadline.stage("firestore_write") as timeout:
+        docs = list(
+            cached_transcripts_query(client, phone_number).stream(timeout=timeout)
+        )
+        for doc in docs:
+            doc.reference.delete(timeout=timeout)
+    return len(docs)
@@ -0,0 +1,437 @@
+"""In-memory stand-in for the Firestore client.
+
+Implements the subset of the google.cloud.firestore Client API that
+database/firebase.py and the tools rely on (collection/document get, set,
+update, delete, ArrayUnion and DELETE_FIELD transforms, transactions, filtered
+queries and the bulk writer), so the real accessors can run without a
+Firestore project. Used by the benchmarks and by local tooling.
+
+Like Firestore, documents are copied on every read and write, so callers never
+share mutable state with the store. Set `latency` to make every document
+read/write block for that many seconds, like a synchronous RPC would.
+Snapshots carry an update_time, and update() honours a
+`write_option(last_update_time=...)` precondition.
+
+`LocalClient.load(path)` / `client.dump(path)` keep the data in a JSON file,
+so command-line tools can be tried against a store that survives between runs;
+a loaded client writes the file back whenever a bulk writer flushes.
+"""
+
+import copy
+import dataclasses
+import datetime as dt
+import itertools
+import json
+import operator
+import os
+import threading
+import time
+
+from google.api_core import exceptions
+from google.cloud import firestore
+
+
+class LocalClient:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._data: dict[str, dict[str, dict]] = {}
+        self._lock = threading.RLock()
+        self._txn_ids = itertools.count(1)
+        self._path = None
+        self._update_times: dict[str, dt.datetime] = {}
+
+    def collection(self, name: str) -> "LocalCollection":
+        return LocalCollection(self, name)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False):
+        return LocalTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def bulk_writer(self, options=None) -> "LocalBulkWriter":
+        return LocalBulkWriter(self, options)
+
+    def write_option(self, last_update_time=None, **kwargs) -> "LocalWriteOption":
+        return LocalWriteOption(last_update_time)
+
+    @classmethod
+    def load(cls, path: str, latency: float = 0.0) -> "LocalClient":
+        """Client holding the data dumped to `path` (empty if it doesn't exist)."""
+        client = cls(latency=latency)
+        client._path = path
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                client._data = json.load(f, object_hook=_decode)
+        return client
+
+    def dump(self, path: str):
+        with self._lock:
+            data = copy.deepcopy(self._data)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=_encode, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+
+    def _docs(self, collection: str) -> dict[str, dict]:
+        return self._data.setdefault(collection, {})
+
+    def _round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    # Call with _lock held.
+    def _update_time(self, path: str) -> dt.datetime:
+        return self._update_times.setdefault(path, dt.datetime.now(dt.timezone.utc))
+
+    def _touch(self, path: str):
+        now = dt.datetime.now(dt.timezone.utc)
+        previous = self._update_times.get(path)
+        if previous is not None and now <= previous:
+            now = previous + dt.timedelta(microseconds=1)
+        self._update_times[path] = now
+
+
+@dataclasses.dataclass(frozen=True)
+class LocalWriteOption:
+    """Mirrors firestore's LastUpdateOption precondition."""
+
+    last_update_time: dt.datetime | None
+
+
+class LocalCollection:
+    def __init__(self, client: LocalClient, name: str):
+        self._client = client
+        self.id = name
+
+    def document(self, document_id: str) -> "LocalDocumentReference":
+        return LocalDocumentReference(self._client, self.id, document_id)
+
+    def order_by(self, field_path: str) -> "LocalQuery":
+        return LocalQuery(self).order_by(field_path)
+
+    def limit(self, count: int) -> "LocalQuery":
+        return LocalQuery(self).limit(count)
+
+    def where(self, *, filter) -> "LocalQuery":
+        return LocalQuery(self).where(filter=filter)
+
+    def stream(self, **kwargs):
+        return LocalQuery(self).stream()
+
+
+_FILTER_OPS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, options: value in options,
+}
+
+
+class LocalQuery:
+    """Immutable query over one collection; supports what the tools need.
+
+    Ordering is only implemented for the document ID ("__name__"), which is
+    what paginated scans use. Filters take a firestore.FieldFilter on a
+    top-level field; documents missing the field never match.
+    """
+
+    def __init__(self, collection: LocalCollection, **options):
+        self._collection = collection
+        self._options = {
+            "order_by": None,
+            "start_after": None,
+            "limit": None,
+            "filters": (),
+        }
+        self._options.update(options)
+
+    def _copy(self, **changes) -> "LocalQuery":
+        return LocalQuery(self._collection, **{**self._options, **changes})
+
+    def order_by(self, field_path: str) -> "LocalQuery":
+        if field_path != "__name__":
+            raise NotImplementedError("LocalQuery only orders by __name__")
+        return self._copy(order_by=field_path)
+
+    def start_after(self, document_fields: dict) -> "LocalQuery":
+        return self._copy(start_after=document_fields["__name__"])
+
+    def limit(self, count: int) -> "LocalQuery":
+        return self._copy(limit=count)
+
+    def where(self, *, filter) -> "LocalQuery":
+        if filter.op_string not in _FILTER_OPS:
+            raise NotImplementedError(
+                f"LocalQuery doesn't support {filter.op_string!r}"
+            )
+        return self._copy(filters=self._options["filters"] + (filter,))
+
+    def _matches(self, data: dict) -> bool:
+        for f in self._options["filters"]:
+            if f.field_path not in data:
+                return False
+            if not _FILTER_OPS[f.op_string](data[f.field_path], f.value):
+                return False
+        return True
+
+    def stream(self, **kwargs):
+        client = self._collection._client
+        with client._lock:
+            docs = [
+                item
+                for item in client._docs(self._collection.id).items()
+                if self._matches(item[1])
+            ]
+        if self._options["order_by"] or self._options["start_after"] is not None:
+            docs.sort(key=lambda item: item[0])
+        if self._options["start_after"] is not None:
+            docs = [d for d in docs if d[0] > self._options["start_after"]]
+        if self._options["limit"] is not None:
+            docs = docs[: self._options["limit"]]
+        for doc_id, data in docs:
+            reference = self._collection.document(doc_id)
+            with client._lock:
+                update_time = client._update_time(reference.path)
+            yield LocalDocumentSnapshot(
+                reference, copy.deepcopy(data), exists=True, update_time=update_time
+            )
+
+
+class LocalDocumentSnapshot:
+    def __init__(self, reference, data: dict | None, exists: bool, update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = exists
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self) -> dict | None:
+        return self._data
+
+    def get(self, field: str):
+        return self._data[field]
+
+
+class LocalDocumentReference:
+    def __init__(self, client: LocalClient, collection: str, document_id: str):
+        self._client = client
+        self._collection = collection
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection}/{self.id}"
+
+    def get(self, transaction=None, timeout=None, **kwargs) -> LocalDocumentSnapshot:
+        if transaction is None:
+            self._client._round_trip()
+        with self._client._lock:
+            data = self._client._docs(self._collection).get(self.id)
+            if data is None:
+                return LocalDocumentSnapshot(self, None, exists=False)
+            return LocalDocumentSnapshot(
+                self,
+                copy.deepcopy(data),
+                exists=True,
+                update_time=self._client._update_time(self.path),
+            )
+
+    def set(self, document_data: dict, merge: bool = False, timeout=None, **kwargs):
+        self._client._round_trip()
+        with self._client._lock:
+            docs = self._client._docs(self._collection)
+            current = docs.get(self.id, {}) if merge else {}
+            docs[self.id] = _apply(current, document_data)
+            self._client._touch(self.path)
+
+    def update(self, field_updates: dict, option=None, timeout=None, **kwargs):
+        self._client._round_trip()
+        with self._client._lock:
+            docs = self._client._docs(self._collection)
+            if self.id not in docs:
+                raise exceptions.NotFound(f"No document to update: {self.path}")
+            if (
+                option is not None
+                and option.last_update_time is not None
+                and option.last_update_time != self._client._update_time(self.path)
+            ):
+                raise exceptions.FailedPrecondition(
+                    f"{self.path} was updated after {option.last_update_time}"
+                )
+            docs[self.id] = _apply(docs[self.id], field_updates)
+            self._client._touch(self.path)
+
+    def delete(self, timeout=None, **kwargs):
+        self._client._round_trip()
+        with self._client._lock:
+            self._client._docs(self._collection).pop(self.id, None)
+            self._client._update_times.pop(self.path, None)
+
+
+class LocalTransaction:
+    """Buffers writes and applies them atomically on commit.
+
+    Compatible with @firestore.transactional: the store lock is held from
+    _begin() until _commit()/_rollback(), so reads and writes inside the
+    transaction see a consistent document.
+    """
+
+    def __init__(self, client: LocalClient, max_attempts: int, read_only: bool):
+        self._client = client
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._writes = []
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._client._lock.acquire()
+        self._id = next(self._client._txn_ids)
+
+    def _commit(self) -> list:
+        try:
+            for method, doc_ref, args in self._writes:
+                getattr(doc_ref, method)(*args)
+            return []
+        finally:
+            self._release()
+
+    def _rollback(self):
+        self._release()
+
+    def _release(self):
+        if self._id is not None:
+            self._clean_up()
+            self._client._lock.release()
+
+    def set(self, reference, document_data: dict, merge: bool = False):
+        self._writes.append(("set", reference, (document_data, merge)))
+
+    def update(self, reference, field_updates: dict, option=None):
+        self._writes.append(("update", reference, (field_updates,)))
+
+    def delete(self, reference, option=None):
+        self._writes.append(("delete", reference, ()))
+
+
+@dataclasses.dataclass
+class LocalBulkWriterOperation:
+    reference: LocalDocumentReference
+    attempts: int = 0
+
+
+@dataclasses.dataclass
+class LocalBulkWriteFailure:
+    """Mirrors firestore's BulkWriteFailure for on_write_error callbacks."""
+
+    operation: LocalBulkWriterOperation
+    code: int
+    message: str
+
+    @property
+    def attempts(self) -> int:
+        return self.operation.attempts
+
+
+class LocalBulkWriter:
+    """Applies queued writes on flush(), honouring max_ops_per_second.
+
+    Like firestore's BulkWriter, a failed write is passed to the
+    on_write_error callback and retried for as long as it returns True.
+    """
+
+    def __init__(self, client: LocalClient, options=None):
+        self._client = client
+        max_ops = getattr(options, "max_ops_per_second", 0) or 0
+        self._min_interval = 1 / max_ops if max_ops > 0 else 0
+        self._queue = []
+        self._on_error = lambda failure, writer: failure.attempts < 15
+        self._on_result = None
+        self._closed = False
+
+    def on_write_error(self, callback):
+        self._on_error = callback
+
+    def on_write_result(self, callback):
+        self._on_result = callback
+
+    def set(self, reference, document_data: dict, merge: bool = False):
+        self._enqueue("set", reference, (document_data, merge))
+
+    def update(self, reference, field_updates: dict, option=None):
+        self._enqueue("update", reference, (field_updates, option))
+
+    def delete(self, reference, option=None):
+        self._enqueue("delete", reference, ())
+
+    def _enqueue(self, method: str, reference, args: tuple):
+        if self._closed:
+            raise Exception("BulkWriter is closed")
+        self._queue.append((method, reference, args))
+
+    def flush(self):
+        queue, self._queue = self._queue, []
+        for method, reference, args in queue:
+            operation = LocalBulkWriterOperation(reference)
+            while True:
+                started = time.monotonic()
+                operation.attempts += 1
+                try:
+                    getattr(reference, method)(*args)
+                    if self._on_result:
+                        self._on_result(reference, None, self)
+                    break
+                except exceptions.GoogleAPICallError as exc:
+                    failure = LocalBulkWriteFailure(
+                        operation, exc.grpc_status_code.value[0], exc.message
+                    )
+                    if not self._on_error(failure, self):
+                        break
+                finally:
+                    time.sleep(
+                        max(0.0, self._min_interval - (time.monotonic() - started))
+                    )
+        if queue and self._client._path:
+            self._client.dump(self._client._path)
+
+    def close(self):
+        self.flush()
+        self._closed = True
+
+
+def _encode(value):
+    if isinstance(value, dt.datetime):
+        return {"$datetime": value.isoformat()}
+    raise TypeError(f"Can't store {type(value).__name__} in a local store file")
+
+
+def _decode(obj: dict):
+    if obj.keys() == {"$datetime"}:
+        return dt.datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+
+def _apply(current: dict, changes: dict) -> dict:
+    """Return a copy of `current` with Firestore-style field changes applied."""
+    # Stored values are never mutated in place, so a shallow copy is enough.
+    result = dict(current)
+    for key, value in changes.items():
+        if value is firestore.DELETE_FIELD:
+            result.pop(key, None)
+        elif isinstance(value, firestore.ArrayUnion):
+            existing = list(result.get(key) or [])
+            for item in value.values:
+                if item not in existing:
+                    existing.append(copy.deepcopy(item))
+            result[key] = existing
+        else:
+            result[key] = copy.deepcopy(value)
+    return result
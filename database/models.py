@@ -1,5 +1,5 @@
 from datetime import datetime, timezone
-from typing import List
+from typing import List, Optional
 
 import pydantic
 
@@ -10,6 +10,8 @@ class TrustRating(pydantic.BaseModel):
         default_factory=lambda: datetime.now(timezone.utc)
     )
     message_index: int
+    # "campaign" for ratings answering a check-in sent by tools/send_check_in.py
+    source: Optional[str] = None
 
 
 class Message(pydantic.BaseModel):
@@ -18,6 +20,8 @@ class Message(pydantic.BaseModel):
     timestamp: datetime = pydantic.Field(
         default_factory=lambda: datetime.now(timezone.utc)
     )
+    # prompt/completion/cached token counts of the LLM call that produced it
+    usage: Optional[dict] = None
 
 
 class Conversation(pydantic.BaseModel):
@@ -36,6 +40,9 @@ class Conversation(pydantic.BaseModel):
     user_turn_count: int = 0
     intro_sent: bool = False
     pending_ai_response: str = ""
+    # Set while awaiting a rating for a check-in that didn't come from this
+    # conversation (TrustRating.source).
+    check_in_source: str = ""
 
     def to_firestore(self) -> dict:
         """Converts the model to a dict, ensuring datetimes are handled."""
@@ -0,0 +1,99 @@
+"""Write-behind persistence so replies don't wait on Firestore writes.
+
+Handlers return their Firestore writes as zero-argument callables (the usual
+database/firebase.py functions, which return False on failure). `submit()`
+runs them in a worker thread after the reply is on its way:
+
+- Writes for one key (a conversation) run in submission order, and
+  `wait_for(key)` lets the next message for that conversation wait until
+  they've landed, so it never reads stale state.
+- A write that returns False or raises is retried with backoff; one that still
+  fails is logged with its arguments and counted in write_behind.failed.
+  An attempt that timed out may still have committed, so a write must be safe
+  to repeat: build any ArrayUnion element before submitting, not inside the
+  write, so a retry sends the identical element.
+- `flush()` waits for everything outstanding, and runs at shutdown so
+  accepted writes aren't dropped on redeploy.
+
+Writes run outside the per-message deadline, each attempt with its own
+WRITE_BEHIND_TIMEOUT_SECONDS budget.
+"""
+
+import asyncio
+import contextvars
+import logging
+from typing import Callable
+
+import deadline
+import metrics
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+Write = Callable[[], bool]
+
+_inflight: dict[str, asyncio.Task] = {}
+
+
+def submit(key: str, writes: list[Write]) -> asyncio.Task | None:
+    """Schedule `writes` for `key` after any writes already queued for it."""
+    if not writes:
+        return None
+    previous = _inflight.get(key)
+    # Fresh context: persistence must not inherit the message's deadline.
+    task = asyncio.create_task(
+        _run(key, previous, writes), context=contextvars.Context()
+    )
+    _inflight[key] = task
+    task.add_done_callback(lambda t: _forget(key, t))
+    metrics.increment("write_behind.submitted", len(writes))
+    return task
+
+
+async def wait_for(key: str) -> None:
+    """Wait until all writes submitted so far for `key` have finished."""
+    task = _inflight.get(key)
+    if task is not None:
+        await asyncio.shield(task)
+
+
+async def flush(timeout: float | None = None) -> int:
+    """Wait for all outstanding writes. Returns how many keys were unfinished."""
+    tasks = list(_inflight.values())
+    if not tasks:
+        return 0
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    if pending:
+        logger.error("write-behind flush timed out with %s keys pending", len(pending))
+    return len(pending)
+
+
+def _forget(key: str, task: asyncio.Task):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+
+
+async def _run(key: str, previous: asyncio.Task | None, writes: list[Write]):
+    if previous is not None:
+        await asyncio.wait([previous])
+    for write in writes:
+        await _apply(key, write)
+
+
+async def _apply(key: str, write: Write):
+    attempts = settings.WRITE_BEHIND_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        try:
+            with deadline.budget(settings.WRITE_BEHIND_TIMEOUT_SECONDS):
+                if await asyncio.to_thread(write):
+                    metrics.increment("write_behind.completed")
+                    return
+        except Exception:
+            logger.exception("write-behind attempt %s failed for key=%s", attempt, key)
+        if attempt < attempts:
+            metrics.increment("write_behind.retries")
+            await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+    metrics.increment("write_behind.failed")
+    name = getattr(write, "func", write).__name__
+    logger.error("write-behind gave up on %s for key=%s", name, key)
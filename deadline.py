@@ -0,0 +1,101 @@
+"""Per-message deadline shared by every stage of the processing pipeline.
+
+`process_whatsapp_ai` opens a budget with `budget(seconds)`. Each network
+stage (media download, Whisper, Firestore, LLM, Graph send) then draws its
+timeout from whatever is left, either through `run()` for awaitables or
+`stage()` for sync calls that accept a `timeout=` argument (Firestore).
+
+When the budget runs out, `DeadlineExceeded` is raised with the name of the
+stage that used it up, and `deadline.exhausted.<stage>` is incremented.
+Outside a budget (scripts, benchmarks) stages run without a timeout.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import inspect
+import time
+from typing import Awaitable, Iterator, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+_expires_at: contextvars.ContextVar[float | None] = contextvars.ContextVar(
+    "deadline_expires_at", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the per-message budget runs out during `stage`."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"deadline exceeded during {stage}")
+        self.stage = stage
+
+
+@contextlib.contextmanager
+def budget(seconds: float) -> Iterator[None]:
+    """Run the enclosed block under a fresh deadline `seconds` from now."""
+    token = _expires_at.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _expires_at.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left in the current budget, or None when no budget is set."""
+    expires_at = _expires_at.get()
+    if expires_at is None:
+        return None
+    return expires_at - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def _exhausted(stage_name: str) -> DeadlineExceeded:
+    metrics.increment(f"deadline.exhausted.{stage_name}")
+    return DeadlineExceeded(stage_name)
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[float | None]:
+    """Yield the timeout (seconds, or None) available to a sync stage.
+
+    Any error raised inside the block once the budget has run out (e.g. the
+    client library's own timeout exception) is re-raised as DeadlineExceeded.
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise _exhausted(name)
+    try:
+        yield left
+    except DeadlineExceeded:
+        raise
+    except Exception as exc:
+        if expired():
+            raise _exhausted(name) from exc
+        raise
+
+
+async def run(name: str, awaitable: Awaitable[T]) -> T:
+    """Await `awaitable`, cancelling it if the current budget runs out."""
+    try:
+        with stage(name) as timeout:
+            try:
+                return await asyncio.wait_for(awaitable, timeout)
+            except TimeoutError:
+                if timeout is None:
+                    raise
+                raise _exhausted(name) from None
+    finally:
+        # Don't leak a never-awaited coroutine if the budget was already spent.
+        if (
+            inspect.iscoroutine(awaitable)
+            and inspect.getcoroutinestate(awaitable) == inspect.CORO_CREATED
+        ):
+            awaitable.close()
@@ -0,0 +1,138 @@
+"""Event-loop stall detection and an on-demand sampling profiler.
+
+LoopStallMonitor: a heartbeat task on the event loop stamps the time every
+`interval` seconds, and a watchdog thread checks the stamp. When the loop
+misses its heartbeat by more than `threshold`, the watchdog grabs the loop
+thread's stack while it is still blocked, so the record points at the sync
+call (Firestore, file logging, ...) that froze the loop rather than at
+whatever ran after it. The stack is logged right away, so a loop that never
+recovers still leaves a trace; the stall's duration is recorded once the
+loop beats again.
+
+sample_profile: samples every thread's stack for N seconds and returns them in
+the collapsed "frame;frame;frame count" format used by flamegraph.pl,
+speedscope and inferno.
+
+Both only wake up every few milliseconds, so they can stay on in production.
+"""
+
+import asyncio
+import collections
+import dataclasses
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class Stall:
+    started_at: datetime
+    duration_s: float
+    stack: list[str]
+
+
+class LoopStallMonitor:
+    def __init__(self, threshold: float, interval: float = 0.05, max_records: int = 50):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls: collections.deque[Stall] = collections.deque(maxlen=max_records)
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start monitoring the running event loop. Call from the loop thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-stall-monitor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _beat(self):
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        stalled_beat = None
+        stalled_since = None
+        stack = []
+        while not self._stop.wait(self.interval):
+            beat = self._last_beat
+            if stalled_beat is not None and beat != stalled_beat:
+                # The loop is running again; the gap between beats is the stall.
+                self._record(stalled_since, beat - stalled_beat - self.interval, stack)
+                stalled_beat = None
+
+            lag = time.monotonic() - beat - self.interval
+            if stalled_beat is None and lag > self.threshold:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = traceback.format_stack(frame) if frame is not None else []
+                stalled_beat = beat
+                stalled_since = datetime.now(timezone.utc)
+                logger.warning(
+                    "Event loop blocked for %.3fs and counting; loop thread is in:\n%s",
+                    lag,
+                    "".join(stack[-8:]),
+                )
+
+    def _record(self, started_at: datetime, duration: float, stack: list[str]):
+        self.stalls.append(
+            Stall(started_at=started_at, duration_s=duration, stack=stack)
+        )
+        metrics.increment("loop.stalls")
+        metrics.increment("loop.stall_seconds", duration)
+        logger.warning(
+            "Event loop stalled for %.3fs; recovered (stack logged when detected)",
+            duration,
+        )
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def sample_profile(seconds: float, interval: float = 0.005) -> str:
+    """Sample all threads for `seconds` and return collapsed stacks.
+
+    Each output line is "thread;outer;...;inner count". Runs in the calling
+    thread, which is excluded from the samples.
+    """
+    me = threading.get_ident()
+    counts: collections.Counter[str] = collections.Counter()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
@@ -17,12 +17,13 @@ async def test_simple_message():
     print("Sending test message to OpenAI...")
     response = await openai_client.get_ai_response(messages)
     print(f"Response: {response}")
-    
+
+
 @pytest.mark.asyncio
 async def test_audio_message():
     with open("e2e/sample.ogg", "rb") as f:
         audio_bytes = f.read()
-    
+
     transcript = await openai_client.transcribe_audio(audio_bytes)
     print(transcript)
     assert isinstance(transcript, str)
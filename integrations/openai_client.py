@@ -1,6 +1,9 @@
-import openai
+import dataclasses
 import io
 
+import openai
+
+import deadline
 from config import settings
 
 client = openai.AsyncOpenAI(
@@ -8,6 +11,49 @@ client = openai.AsyncOpenAI(
 )  # model level, initialized once
 
 
+@dataclasses.dataclass
+class Completion:
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0  # prompt tokens served from the provider's prompt cache
+
+    def usage(self) -> dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+        }
+
+
+async def get_completion(
+    messages: list[dict], cache_key: str | None = None
+) -> Completion:
+    """Get a response from the LLM along with its token usage.
+
+    Args:
+        messages: The full request, system messages included. Prompt caching
+            matches on the longest identical prefix, so put what is shared
+            across users first.
+        cache_key: Routes requests sharing a prefix to the same cache
+            (e.g. the prompt variant).
+    """
+    kwargs = {"prompt_cache_key": cache_key} if cache_key else {}
+    response = await deadline.run(
+        "llm",
+        client.chat.completions.create(model="gpt-4", messages=messages, **kwargs),
+    )
+
+    completion = Completion(text=response.choices[0].message.content)
+    usage = response.usage
+    if usage is not None:
+        completion.prompt_tokens = usage.prompt_tokens
+        completion.completion_tokens = usage.completion_tokens
+        details = usage.prompt_tokens_details
+        completion.cached_tokens = (details.cached_tokens or 0) if details else 0
+    return completion
+
+
 async def get_ai_response(messages: list[dict], system_prompt: str) -> str:
     """Get response from LLM.
 
@@ -17,20 +63,18 @@ async def get_ai_response(messages: list[dict], system_prompt: str) -> str:
     Returns:
         AI-generated response text
     """
-
-    response = await client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "system", "content": system_prompt}] + messages,
+    completion = await get_completion(
+        [{"role": "system", "content": system_prompt}] + messages
     )
+    return completion.text
 
-    return response.choices[0].message.content
 
 async def transcribe_audio(audio_bytes: bytes) -> str:
     # is it smart to add a try catch block here? or should that be done elsewhere. I was thinking we try creating this new text, and if not default to "error"
     audio_file = io.BytesIO(audio_bytes)
     audio_file.name = "audio.ogg"
-    response = await client.audio.transcriptions.create(
-        model='whisper-1',
-        file=audio_file
+    response = await deadline.run(
+        "transcription",
+        client.audio.transcriptions.create(model="whisper-1", file=audio_file),
     )
-    return response.text
\ No newline at end of file
+    return response.text
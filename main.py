@@ -1,13 +1,34 @@
+import asyncio
+import contextlib
+import functools
+import hmac
 import json
 import logging
 
 import httpx
-from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request
+from fastapi import (
+    BackgroundTasks,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+)
+from fastapi.responses import PlainTextResponse
 
 import database.firebase as firebase_db
+import database.write_behind as write_behind
+import deadline
+import diagnostics
+import metrics
 from config import settings
-from integrations import openai_client
-from services import conversation_service, trust_service
+from services import (
+    conversation_service,
+    number_registry,
+    outbound_payloads,
+    transcription_service,
+)
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -19,55 +40,182 @@ logging.basicConfig(
     ],
 )
 
+loop_monitor = diagnostics.LoopStallMonitor(
+    threshold=settings.LOOP_STALL_THRESHOLD_MS / 1000
+)
+_profile_lock = asyncio.Lock()
+
 
-app = FastAPI()
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.LOOP_STALL_THRESHOLD_MS > 0:
+        loop_monitor.start()
+    yield
+    loop_monitor.stop()
+    # Don't drop conversation writes for replies that already went out.
+    await write_behind.flush(timeout=settings.WRITE_BEHIND_TIMEOUT_SECONDS)
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Initialize Firestore client at startup
 firestore_client = firebase_db.init_firestore()
 
-_WA_HEADERS = {"Authorization": f"Bearer {settings.ACCESS_TOKEN}"}
+# phone_number_id -> WhatsAppNumber for every number this instance serves
+whatsapp_numbers = number_registry.load()
+outbound_payloads.precompute(whatsapp_numbers.values())
 
 
-async def process_whatsapp_ai(phone_number: str, message_text: str, msg_type: str):
+async def process_whatsapp_ai(
+    number: number_registry.WhatsAppNumber,
+    phone_number: str,
+    message_text: str,
+    msg_type: str,
+):
     """Process incoming WhatsApp message and send AI response.
 
-    Runs as a background task after the webhook response is sent.
+    Runs as a background task after the webhook response is sent. Every
+    network call below draws from one budget of MESSAGE_DEADLINE_SECONDS; if
+    it runs out, or the reply can't be built for any other reason, the user
+    gets a "please try again" reply (in the conversation's language once it
+    is known) instead of silence.
+
+    The reply is sent as soon as it exists; the Firestore writes it implies
+    are handed to write_behind and land afterwards.
     """
-    try:
-        # intercept voice messages first.
-        if msg_type == "audio":
-            audio_bytes = await download_whatsapp_audio(message_text)
-            message_text = await openai_client.transcribe_audio(audio_bytes)
-            msg_type = "text"
-
-        bot_response = await conversation_service.handle_incoming_message(
-            firestore_client, phone_number, message_text, msg_type
-        )
+    key = f"{number.firestore_namespace}:{phone_number}"
+    sending = False
+    with deadline.budget(settings.MESSAGE_DEADLINE_SECONDS):
+        try:
+            bot_response = await _build_bot_response(
+                number, phone_number, message_text, msg_type, key
+            )
+            write_behind.submit(key, bot_response.pending_writes)
+            if not (bot_response.deadline_exceeded or bot_response.failed):
+                sending = True
+                await _send_bot_response(number, phone_number, bot_response)
+                return
+        except deadline.DeadlineExceeded as exc:
+            if exc.stage == "whatsapp_send":
+                # Part of the reply may already be out; don't follow it with an apology.
+                logger.warning(
+                    "Deadline exceeded sending reply to phone_number=%s", phone_number
+                )
+                return
+            # Conversation (and its language) couldn't be loaded in time.
+            bot_response = conversation_service.fallback_response(
+                exc, number.default_language
+            )
+        except Exception as exc:
+            _log_failure(phone_number, msg_type, exc)
+            if sending:
+                return
+            bot_response = conversation_service.fallback_response(
+                exc, number.default_language
+            )
+
+    logger.warning(
+        "No reply for phone_number=%s msg_type=%s; sending retry message",
+        phone_number,
+        msg_type,
+    )
+    with deadline.budget(settings.DEADLINE_GRACE_SECONDS):
+        try:
+            await _send_bot_response(number, phone_number, bot_response)
+        except Exception:
+            logger.exception(
+                "Failed to send retry message to phone_number=%s", phone_number
+            )
 
-        for text in bot_response.text_messages:
-            await send_message_to_whatsapp(phone_number, text)
 
-        if bot_response.send_trust_flow:
-            body_text = trust_service.get_trust_prompt(
-                language=bot_response.trust_flow_language,
-                prompt_key=bot_response.trust_flow_prompt_key,
+def _log_failure(phone_number: str, msg_type: str, exc: BaseException):
+    if isinstance(exc, deadline.DeadlineExceeded):
+        return  # expected; the "no reply" warning covers it
+    logger.error(
+        "process_whatsapp_ai failed for phone_number=%s msg_type=%s",
+        phone_number,
+        msg_type,
+        exc_info=exc,
+    )
+
+
+async def _build_bot_response(
+    number: number_registry.WhatsAppNumber,
+    phone_number: str,
+    message_text: str,
+    msg_type: str,
+    key: str,
+) -> conversation_service.BotResponse:
+    client = firebase_db.namespaced(firestore_client, number.firestore_namespace)
+
+    # The previous message's writes must land before this one reads the conversation.
+    await deadline.run("write_behind", write_behind.wait_for(key))
+    loading = conversation_service.load_conversation(
+        client, phone_number, number.default_language
+    )
+
+    # intercept voice messages first; download/transcribe while the conversation loads.
+    if msg_type == "audio":
+        # A failed transcription still needs the conversation's language.
+        conversation, transcript = await asyncio.gather(
+            loading,
+            transcription_service.transcribe_voice_note(
+                client,
+                phone_number,
+                message_text,
+                functools.partial(download_whatsapp_audio, number),
+            ),
+            return_exceptions=True,
+        )
+        if isinstance(conversation, BaseException):
+            raise conversation
+        if isinstance(transcript, Exception):
+            _log_failure(phone_number, msg_type, transcript)
+            return conversation_service.fallback_response(
+                transcript, conversation.language
             )
-            if settings.USE_FLOWS:
-                await send_flow_to_whatsapp(phone_number, body_text, bot_response.trust_flow_language)
-            else:
-                await send_message_to_whatsapp(phone_number, body_text)
+        if isinstance(transcript, BaseException):
+            raise transcript
+        message_text, msg_type = transcript, "text"
+    else:
+        conversation = await loading
 
-    except Exception:
-        logger.exception(
-            "process_whatsapp_ai failed for phone_number=%s msg_type=%s",
+    try:
+        return await conversation_service.handle_incoming_message(
+            client,
             phone_number,
+            message_text,
             msg_type,
+            number.default_language,
+            conversation=conversation,
+        )
+    except Exception as exc:
+        _log_failure(phone_number, msg_type, exc)
+        return conversation_service.fallback_response(exc, conversation.language)
+
+
+async def _send_bot_response(
+    number: number_registry.WhatsAppNumber,
+    phone_number: str,
+    bot_response: conversation_service.BotResponse,
+):
+    for text in bot_response.text_messages:
+        await send_message_to_whatsapp(number, phone_number, text)
+
+    if bot_response.send_trust_flow:
+        await send_trust_prompt_to_whatsapp(
+            number,
+            phone_number,
+            bot_response.trust_flow_language,
+            bot_response.trust_flow_prompt_key,
         )
 
 
-async def send_message_to_whatsapp(to_phone: str, text: str):
+async def send_message_to_whatsapp(
+    number: number_registry.WhatsAppNumber, to_phone: str, text: str
+):
     logging.debug("[DEBUG] Sending this message back to WhatsAPP: %s", text)
-    url = f"https://graph.facebook.com/v22.0/{settings.PHONE_NUMBER_ID}/messages"
+    url = number.messages_url
     payload = {
         "messaging_product": "whatsapp",
         "to": to_phone,
@@ -75,7 +223,9 @@ async def send_message_to_whatsapp(to_phone: str, text: str):
         "text": {"body": text},
     }
     async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload, headers=_WA_HEADERS)
+        response = await deadline.run(
+            "whatsapp_send", client.post(url, json=payload, headers=number.headers)
+        )
         if response.status_code != 200:
             logger.error(
                 "WhatsApp API error status=%s to_phone=%s body=%s",
@@ -84,34 +234,29 @@ async def send_message_to_whatsapp(to_phone: str, text: str):
                 response.text,
             )
         else:
-            logger.debug("WhatsApp API success to_phone=%s: %s", to_phone, response.text)
+            logger.debug(
+                "WhatsApp API success to_phone=%s: %s", to_phone, response.text
+            )
 
 
-async def send_flow_to_whatsapp(to_phone: str, body_text: str, language: str = "PT"):
-    logger.debug("[DEBUG] FLOW being sent back to WhatsApp")
-    flow_id = settings.FLOW_ID_PT if language.upper() == "PT" else settings.FLOW_ID_EN
-    url = f"https://graph.facebook.com/v22.0/{settings.PHONE_NUMBER_ID}/messages"
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": to_phone,
-        "type": "interactive",
-        "interactive": {
-            "type": "flow",
-            "body": {"text": body_text},
-            "action": {
-                "name": "flow",
-                "parameters": {
-                    "flow_message_version": "3",
-                    "flow_id": flow_id,
-                    "flow_cta": "Avaliar Agora" if language.upper() == "PT" else "Rate Now",
-                    "flow_action": "navigate",
-                    "flow_action_payload": {"screen": "QUESTION_ONE"},
-                },
-            },
-        },
-    }
+async def send_trust_prompt_to_whatsapp(
+    number: number_registry.WhatsAppNumber,
+    to_phone: str,
+    language: str,
+    prompt_key: str,
+):
+    """Send a trust prompt: a Flow if USE_FLOWS is on, plain text otherwise.
+
+    The body is precomputed per number/language/mode (see
+    services/outbound_payloads.py); only the recipient is filled in here.
+    """
+    logger.debug("[DEBUG] Trust prompt %s being sent back to WhatsApp", prompt_key)
+    body = outbound_payloads.trust_prompt(number, language, prompt_key).render(to_phone)
     async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload, headers=_WA_HEADERS)
+        response = await deadline.run(
+            "whatsapp_send",
+            client.post(number.messages_url, content=body, headers=number.json_headers),
+        )
         if response.status_code != 200:
             logger.error(
                 "WhatsApp flow API error status=%s to_phone=%s body=%s",
@@ -120,23 +265,32 @@ async def send_flow_to_whatsapp(to_phone: str, body_text: str, language: str = "
                 response.text,
             )
         else:
-            logger.debug("WhatsApp flow API success to_phone=%s: %s", to_phone, response.text)
+            logger.debug(
+                "WhatsApp flow API success to_phone=%s: %s", to_phone, response.text
+            )
 
 
-async def download_whatsapp_audio(media_id: str) -> bytes:
+async def download_whatsapp_audio(
+    number: number_registry.WhatsAppNumber, media_id: str
+) -> bytes:
     async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"https://graph.facebook.com/v22.0/{media_id}", headers=_WA_HEADERS
+        r = await deadline.run(
+            "media_metadata",
+            client.get(
+                f"https://graph.facebook.com/v22.0/{media_id}", headers=number.headers
+            ),
         )
         r.raise_for_status()
         media_url = r.json()["url"]
-        audio_r = await client.get(media_url, headers=_WA_HEADERS)
+        audio_r = await deadline.run(
+            "media_download", client.get(media_url, headers=number.headers)
+        )
         audio_r.raise_for_status()
         return audio_r.content
 
 
 @app.post("/")
-async def handle_webhook(request: Request, background_tasks: BackgroundTasks): 
+async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
     """Receive incoming WhatsApp messages and queue for processing."""
     data = await request.json()
 
@@ -149,31 +303,33 @@ async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
                 for change in entry.get("changes", []):
                     value = change.get("value", {})
                     metadata = value.get("metadata", {})
-                    incoming_phone_id = metadata.get("phone_number_id")
-                    if (
-                        value
-                        and "messages" in value
-                        and incoming_phone_id == str(settings.PHONE_NUMBER_ID)
-                    ):
-                        messages_to_process.extend(value["messages"])
+                    number = whatsapp_numbers.get(metadata.get("phone_number_id"))
+                    if value and "messages" in value and number is not None:
+                        messages_to_process.extend(
+                            (number, message) for message in value["messages"]
+                        )
 
         # Handle direct value payload (field + value structure)
         elif data.get("field") == "messages" and "value" in data:
             value = data["value"]
             metadata = value.get("metadata", {})
-            incoming_phone_id = str(metadata.get("phone_number_id", ""))
-            if "messages" in value and incoming_phone_id == str(settings.PHONE_NUMBER_ID):
-                messages_to_process.extend(value["messages"])
+            number = whatsapp_numbers.get(str(metadata.get("phone_number_id", "")))
+            if "messages" in value and number is not None:
+                messages_to_process.extend(
+                    (number, message) for message in value["messages"]
+                )
 
         # Process each text message
-        for message in messages_to_process:
+        for number, message in messages_to_process:
             sender = message.get("from")
             msg_type = message.get("type")
 
             # handles normal texts
             if msg_type == "text" and "text" in message:
                 text = message["text"]["body"]
-                background_tasks.add_task(process_whatsapp_ai, sender, text, msg_type)
+                background_tasks.add_task(
+                    process_whatsapp_ai, number, sender, text, msg_type
+                )
 
             # handles flows
             elif msg_type == "interactive" and "interactive" in message:
@@ -186,13 +342,15 @@ async def handle_webhook(request: Request, background_tasks: BackgroundTasks):
                     rating_value = response_json.get("confidence_rating", "")
                     reply_id = f"rating_{rating_value}"
                     background_tasks.add_task(
-                        process_whatsapp_ai, sender, reply_id, msg_type
+                        process_whatsapp_ai, number, sender, reply_id, msg_type
                     )
 
             # handles voice messages
             elif msg_type == "audio" and "audio" in message:
                 media_id = message["audio"]["id"]
-                background_tasks.add_task(process_whatsapp_ai, sender, media_id, msg_type)
+                background_tasks.add_task(
+                    process_whatsapp_ai, number, sender, media_id, msg_type
+                )
 
         return {"status": "accepted"}
 
@@ -221,3 +379,52 @@ def verify_whatsapp(
 @app.get("/health")
 def health():
     return {"status": "healthy"}
+
+
+def _require_debug_token(x_debug_token: str = Header(None)):
+    """Debug endpoints are only available when DEBUG_TOKEN is set and sent."""
+    if not settings.DEBUG_TOKEN or not hmac.compare_digest(
+        (x_debug_token or "").encode(), settings.DEBUG_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Invalid debug token")
+
+
+@app.get("/debug/metrics", dependencies=[Depends(_require_debug_token)])
+def debug_metrics():
+    return {
+        **metrics.snapshot(),
+        **transcription_service.stats(),
+        "llm_usage": conversation_service.llm_usage_stats(),
+    }
+
+
+@app.get("/debug/stalls", dependencies=[Depends(_require_debug_token)])
+def debug_stalls():
+    """Most recent event-loop stalls, newest last, with the blocking stack."""
+    return {
+        "threshold_ms": settings.LOOP_STALL_THRESHOLD_MS,
+        "stalls": [
+            {
+                "started_at": stall.started_at.isoformat(),
+                "duration_s": round(stall.duration_s, 4),
+                "stack": stall.stack,
+            }
+            for stall in loop_monitor.stalls
+        ],
+    }
+
+
+@app.get(
+    "/debug/profile",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(_require_debug_token)],
+)
+async def debug_profile(seconds: float = Query(10, gt=0, le=60)):
+    """Sample all threads for `seconds` and return collapsed stacks.
+
+    Feed the output to flamegraph.pl or drop it into speedscope.app.
+    """
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    async with _profile_lock:
+        return await asyncio.to_thread(diagnostics.sample_profile, seconds)
@@ -0,0 +1,35 @@
+"""In-process counters for operational telemetry.
+
+Counters are plain named numbers (e.g. "deadline.exhausted.llm") kept for the
+lifetime of the process. They are cheap enough to bump on every message.
+"""
+
+import collections
+import threading
+
+_lock = threading.Lock()
+_counters: collections.Counter[str] = collections.Counter()
+
+
+def increment(name: str, amount: float = 1) -> None:
+    """Add `amount` to the counter called `name`."""
+    with _lock:
+        _counters[name] += amount
+
+
+def get(name: str) -> float:
+    """Return the current value of a counter (0 if never incremented)."""
+    with _lock:
+        return _counters[name]
+
+
+def snapshot(prefix: str = "") -> dict[str, float]:
+    """Return a copy of all counters, optionally filtered by name prefix."""
+    with _lock:
+        return {k: v for k, v in sorted(_counters.items()) if k.startswith(prefix)}
+
+
+def reset() -> None:
+    """Clear all counters."""
+    with _lock:
+        _counters.clear()
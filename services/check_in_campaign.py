@@ -0,0 +1,90 @@
+"""Send the same trust prompt to many users at once.
+
+Used for scheduled re-engagement campaigns (see tools/send_check_in.py). All
+sends share one HTTP client and its connection pool, run a few at a time and
+are paced to stay under the number's Graph API throughput limit. Every
+recipient gets the precomputed body for their language with only the "to"
+field spliced in.
+
+A campaign check-in arrives out of the blue rather than after an answer, so
+there is no pending AI response to deliver once the user rates. The caller
+stores follow_up() in its place so the rating is answered with a question
+that restarts the conversation.
+"""
+
+import asyncio
+import logging
+from typing import Iterable
+
+import httpx
+
+import metrics
+from services import number_registry, outbound_payloads
+
+logger = logging.getLogger(__name__)
+
+_SEND_TIMEOUT_SECONDS = 15
+
+_FOLLOW_UPS = {
+    "EN": """Thanks for updating your rating! Since we last talked, has anything you've seen or heard changed how you think about the electronic voting machines?""",
+    "PT": """Obrigado por atualizar sua avaliação! Desde a nossa última conversa, algo que você viu ou ouviu mudou o que você pensa sobre as urnas eletrônicas?""",
+}
+
+
+def follow_up(language: str) -> str:
+    """Localized reply to a campaign check-in rating."""
+    return _FOLLOW_UPS.get(language.upper(), _FOLLOW_UPS["EN"])
+
+
+async def send_batch(
+    number: number_registry.WhatsAppNumber,
+    recipients: Iterable[tuple[str, str]],
+    prompt_key: str = "check_in",
+    max_concurrency: int = 10,
+    max_per_second: float = 50,
+) -> list[str]:
+    """Send `prompt_key` to each (phone_number, language) in `recipients`.
+
+    Returns the phone numbers the Graph API accepted; failures are logged and
+    counted in check_in_campaign.failed.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    interval = 1 / max_per_second if max_per_second > 0 else 0
+    next_slot = loop.time()
+
+    async def _send(client: httpx.AsyncClient, phone_number: str, language: str):
+        nonlocal next_slot
+        body = outbound_payloads.trust_prompt(number, language, prompt_key).render(
+            phone_number
+        )
+        async with semaphore:
+            now = loop.time()
+            wait, next_slot = next_slot - now, max(now, next_slot) + interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                response = await client.post(
+                    number.messages_url, content=body, headers=number.json_headers
+                )
+            except httpx.HTTPError:
+                logger.exception("Campaign send failed to_phone=%s", phone_number)
+                metrics.increment("check_in_campaign.failed")
+                return None
+        if response.status_code != 200:
+            logger.error(
+                "WhatsApp API error status=%s to_phone=%s body=%s",
+                response.status_code,
+                phone_number,
+                response.text,
+            )
+            metrics.increment("check_in_campaign.failed")
+            return None
+        metrics.increment("check_in_campaign.sent")
+        return phone_number
+
+    async with httpx.AsyncClient(timeout=_SEND_TIMEOUT_SECONDS) as client:
+        results = await asyncio.gather(
+            *(_send(client, phone, language) for phone, language in recipients)
+        )
+    return [phone for phone in results if phone is not None]
@@ -1,11 +1,30 @@
+import asyncio
 import dataclasses
+import functools
 
-from database import firebase
+import deadline
+import metrics
+from database import firebase, models
 from integrations import openai_client
-from services import prompt_service, trust_service
+from services import (
+    fast_path_service,
+    prompt_service,
+    transcription_service,
+    trust_service,
+)
 
 _N_HISTORY_TURNS = 5
 
+_RETRY_MESSAGES = {
+    "EN": "Sorry, I took too long to answer. Please try sending your message again.",
+    "PT": "Desculpe, demorei demais para responder. Por favor, tente enviar sua mensagem novamente.",
+}
+
+_ERROR_MESSAGES = {
+    "EN": "Sorry, something went wrong on my side. Please try sending your message again.",
+    "PT": "Desculpe, algo deu errado do meu lado. Por favor, tente enviar sua mensagem novamente.",
+}
+
 
 @dataclasses.dataclass
 class BotResponse:
@@ -13,21 +32,69 @@ class BotResponse:
     send_trust_flow: bool = False
     trust_flow_language: str = "EN"
     trust_flow_prompt_key: str = "intro"
+    # Set when the per-message deadline ran out and text_messages holds the
+    # "please try again" reply instead of a normal answer.
+    deadline_exceeded: bool = False
+    # Set when the reply failed for any other reason and text_messages holds
+    # the neutral "something went wrong" reply.
+    failed: bool = False
+    # Firestore writes that don't affect the reply. The caller runs them
+    # (write-behind) once the reply is on its way.
+    pending_writes: list = dataclasses.field(default_factory=list)
+
+
+def get_retry_message(language: str) -> str:
+    """Localized reply sent when a message could not be answered in time."""
+    return _RETRY_MESSAGES.get(language.upper(), _RETRY_MESSAGES["EN"])
+
+
+def get_error_message(language: str) -> str:
+    """Localized reply sent when a message could not be answered at all."""
+    return _ERROR_MESSAGES.get(language.upper(), _ERROR_MESSAGES["EN"])
+
+
+def fallback_response(exc: BaseException, language: str) -> BotResponse:
+    """The "please try again" reply for a message that failed with `exc`."""
+    if isinstance(exc, deadline.DeadlineExceeded):
+        return BotResponse(
+            text_messages=[get_retry_message(language)], deadline_exceeded=True
+        )
+    return BotResponse(text_messages=[get_error_message(language)], failed=True)
+
+
+async def load_conversation(client, phone_number: str, default_language: str = "PT"):
+    """Get or create the conversation (assigning a variant if new).
+
+    The Firestore client is synchronous, so this runs in a worker thread and
+    can overlap with other I/O such as downloading a voice note.
+    """
+    base_variant = prompt_service.assign_variant()
+    full_prompt_name = f"{default_language}_prompt_{base_variant}"
+    return await asyncio.to_thread(
+        firebase.get_or_create_conversation,
+        client,
+        phone_number,
+        language=default_language,
+        variant=full_prompt_name,
+    )
 
 
 async def handle_incoming_message(
-    client, phone_number: str, message_text: str, msg_type: str
+    client,
+    phone_number: str,
+    message_text: str,
+    msg_type: str,
+    default_language: str = "PT",
+    conversation=None,
 ) -> BotResponse:
-    """Main entry point. Routes to the correct handler based on conversation phase."""
+    """Main entry point. Routes to the correct handler based on conversation phase.
 
-    # 1. Get or create conversation (assign variant if new)
-    base_variant = prompt_service.assign_variant()
-    language = "PT"
-    full_prompt_name = f"{language}_prompt_{base_variant}"
+    Pass `conversation` if it was already loaded with load_conversation().
+    """
 
-    conversation = firebase.get_or_create_conversation(
-        client, phone_number, language=language, variant=full_prompt_name
-    )
+    # 1. Get or create conversation (assign variant if new)
+    if conversation is None:
+        conversation = await load_conversation(client, phone_number, default_language)
 
     # Dev commands — bypass all state logic
     if message_text.strip().lower() == "/info":
@@ -46,6 +113,7 @@ async def handle_incoming_message(
 
     if message_text.strip().lower() == "/reset":
         result = firebase.delete_conversation(client, phone_number)
+        transcription_service.forget(phone_number)
         if result:
             return_msg = "User data has been reset. Please clear your chat and restart."
         else:
@@ -67,20 +135,32 @@ async def handle_incoming_message(
     # 2. Route based on conversation phase
     phase = conversation.conversation_phase
 
-    if phase == "awaiting_initial_rating":
-        return await _handle_initial_rating(
-            client, phone_number, message_text, conversation, msg_type
-        )
-
-    elif phase == "awaiting_check_in_rating":
-        return await _handle_check_in_rating(
-            client, phone_number, message_text, conversation, msg_type
-        )
-
-    else:  # "normal" or unknown fallback
-        return await _handle_normal_message(
-            client, phone_number, message_text, conversation, msg_type
-        )
+    try:
+        if phase == "awaiting_initial_rating":
+            return await _handle_initial_rating(
+                client, phone_number, message_text, conversation, msg_type
+            )
+
+        elif phase == "awaiting_check_in_rating":
+            return await _handle_check_in_rating(
+                client, phone_number, message_text, conversation, msg_type
+            )
+
+        else:  # "normal" or unknown fallback
+            response = await _handle_normal_message(
+                client, phone_number, message_text, conversation, msg_type
+            )
+            if conversation.check_in_source:
+                # A campaign check-in lost a race with an earlier turn's
+                # writes; don't label the next in-conversation rating with it.
+                response.pending_writes.append(
+                    functools.partial(
+                        firebase.clear_check_in_source, client, phone_number
+                    )
+                )
+            return response
+    except deadline.DeadlineExceeded as exc:
+        return fallback_response(exc, conversation.language)
 
 
 async def _handle_initial_rating(
@@ -91,11 +171,13 @@ async def _handle_initial_rating(
 
     # First message ever — send the intro, don't process their message
     if not conversation.intro_sent:
-        firebase.update_intro_sent(client, phone_number)
         return BotResponse(
             send_trust_flow=True,
             trust_flow_language=lang,
             trust_flow_prompt_key="intro",
+            pending_writes=[
+                functools.partial(firebase.update_intro_sent, client, phone_number)
+            ],
         )
 
     if msg_type == "interactive":
@@ -112,12 +194,18 @@ async def _handle_initial_rating(
         )
 
     # Valid rating — save and transition to normal conversation
-    firebase.save_trust_rating(client, phone_number, score, message_index=0)
-    firebase.update_conversation_phase(
-        client, phone_number, "normal", user_turn_count=0
-    )
     return BotResponse(
-        text_messages=[trust_service.get_trust_prompt(lang, "rating_received")]
+        text_messages=[trust_service.get_trust_prompt(lang, "rating_received")],
+        pending_writes=[
+            _rating_write(client, phone_number, score, message_index=0),
+            functools.partial(
+                firebase.update_conversation_phase,
+                client,
+                phone_number,
+                "normal",
+                user_turn_count=0,
+            ),
+        ],
     )
 
 
@@ -141,15 +229,29 @@ async def _handle_check_in_rating(
         )
 
     # Valid rating — save and return to normal conversation
-    firebase.save_trust_rating(
-        client, phone_number, score, message_index=conversation.user_turn_count
-    )
-    firebase.update_conversation_phase(client, phone_number, "normal")
-    pending = firebase.get_and_clear_pending_response(client, phone_number) # is this stored in memory? could there be an issue with multiple users, or horizontal scaling and getting routed.
+    pending = await asyncio.to_thread(
+        firebase.get_and_clear_pending_response, client, phone_number
+    )  # is this stored in memory? could there be an issue with multiple users, or horizontal scaling and getting routed.
     messages = []  # can add a potential, "thanks for answering"
     if pending:
         messages.append(pending)
-    return BotResponse(text_messages=messages)
+    writes = [
+        _rating_write(
+            client,
+            phone_number,
+            score,
+            message_index=conversation.user_turn_count,
+            source=conversation.check_in_source or None,
+        ),
+        functools.partial(
+            firebase.update_conversation_phase, client, phone_number, "normal"
+        ),
+    ]
+    if conversation.check_in_source:
+        writes.append(
+            functools.partial(firebase.clear_check_in_source, client, phone_number)
+        )
+    return BotResponse(text_messages=messages, pending_writes=writes)
 
 
 async def _handle_normal_message(
@@ -157,40 +259,157 @@ async def _handle_normal_message(
 ) -> BotResponse:
     """Handle normal LLM-powered conversation, with check-in trigger logic."""
 
+    # Duplicates and content-free messages get a canned re-engage prompt
+    # without an LLM call. They don't count as a turn toward check-ins.
+    rule = fast_path_service.classify(message_text, conversation.history)
+    if rule is not None:
+        metrics.increment(f"fast_path.llm_calls_avoided.{rule}")
+        reply = fast_path_service.get_reply(conversation.language, rule)
+        return BotResponse(
+            text_messages=[reply],
+            pending_writes=_history_writes(client, phone_number, message_text, reply),
+        )
+
     # Check if a check-in should trigger before processing this message
     new_turn_count = conversation.user_turn_count + 1
 
-    system_prompt = prompt_service.get_prompt(
-        language=conversation.language, variant=conversation.prompt_variant
+    # Stable prefix first so the provider can cache it; history changes every turn.
+    messages = _build_prompt_prefix(conversation) + _build_llm_messages(
+        conversation, message_text
     )
 
-    recent_history = conversation.history[-(_N_HISTORY_TURNS * 2) :]
-    messages = [{"role": msg.role, "content": msg.content} for msg in recent_history]
-    messages.append({"role": "user", "content": message_text})
-
-    ai_response = await openai_client.get_ai_response(messages, system_prompt)
+    completion = await openai_client.get_completion(
+        messages, cache_key=conversation.prompt_variant
+    )
+    _record_usage(conversation.prompt_variant, completion)
+    ai_response = completion.text
 
-    # Save messages to history
-    firebase.save_message(client, phone_number, message_text, role="user")
-    firebase.save_message(client, phone_number, ai_response, role="assistant")
+    # Save messages to history (after the reply is sent)
+    writes = _history_writes(
+        client, phone_number, message_text, ai_response, usage=completion.usage()
+    )
 
     # Check if it's time for a rating after processing
     if trust_service.should_trigger_check_in(new_turn_count):
-        firebase.save_pending_response(client, phone_number, ai_response)
-        firebase.update_conversation_phase(
-            client,
-            phone_number,
-            "awaiting_check_in_rating",
-            user_turn_count=new_turn_count,
-        )
+        writes += [
+            functools.partial(
+                firebase.save_pending_response, client, phone_number, ai_response
+            ),
+            functools.partial(
+                firebase.update_conversation_phase,
+                client,
+                phone_number,
+                "awaiting_check_in_rating",
+                user_turn_count=new_turn_count,
+            ),
+        ]
         return BotResponse(
             send_trust_flow=True,
             trust_flow_language=conversation.language,
             trust_flow_prompt_key="check_in",
+            pending_writes=writes,
         )
 
     # No check-in — just the AI response
-    firebase.update_conversation_phase(
-        client, phone_number, "normal", user_turn_count=new_turn_count
+    writes.append(
+        functools.partial(
+            firebase.update_conversation_phase,
+            client,
+            phone_number,
+            "normal",
+            user_turn_count=new_turn_count,
+        )
+    )
+    return BotResponse(text_messages=[ai_response], pending_writes=writes)
+
+
+# The array elements are built here, once, rather than inside the write: a
+# write-behind retry then resends the identical element (timestamp included),
+# which ArrayUnion won't append twice.
+
+
+def _history_writes(
+    client, phone_number, user_text: str, reply: str, usage: dict | None = None
+) -> list:
+    writes = []
+    for role, text, message_usage in (
+        ("user", user_text, None),
+        ("assistant", reply, usage),
+    ):
+        entry = models.Message(role=role, content=text, usage=message_usage)
+        writes.append(
+            functools.partial(
+                firebase.save_message,
+                client,
+                phone_number,
+                text,
+                role=role,
+                entry=entry.model_dump(exclude_none=True),
+            )
+        )
+    return writes
+
+
+def _rating_write(
+    client, phone_number, score: int, message_index: int, source: str | None = None
+):
+    rating = models.TrustRating(score=score, message_index=message_index, source=source)
+    return functools.partial(
+        firebase.save_trust_rating,
+        client,
+        phone_number,
+        score,
+        message_index=message_index,
+        rating=rating.model_dump(exclude_none=True),
     )
-    return BotResponse(text_messages=[ai_response])
+
+
+def _record_usage(variant: str, completion: openai_client.Completion):
+    metrics.increment(f"llm.calls.{variant}")
+    metrics.increment(f"llm.prompt_tokens.{variant}", completion.prompt_tokens)
+    metrics.increment(f"llm.completion_tokens.{variant}", completion.completion_tokens)
+    metrics.increment(f"llm.cached_tokens.{variant}", completion.cached_tokens)
+
+
+def llm_usage_stats() -> dict[str, dict]:
+    """Token usage per prompt variant since process start, with cache hit rate."""
+    stats = {}
+    for name, value in metrics.snapshot("llm.").items():
+        _, field, variant = name.split(".", 2)
+        stats.setdefault(variant, {})[field] = value
+    for usage in stats.values():
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        usage["cache_hit_rate"] = (
+            usage.get("cached_tokens", 0) / prompt_tokens if prompt_tokens else 0.0
+        )
+    return stats
+
+
+def _build_prompt_prefix(conversation) -> list[dict]:
+    """System prompt, then the user's belief level (their initial rating).
+
+    The belief level is only sent to variants whose prompt refers to
+    user_belief_level. The system prompt is identical for everyone on the
+    variant and the belief level never changes for a user, so this prefix
+    stays cacheable turn after turn.
+    """
+    prefix = [
+        prompt_service.get_system_message(
+            conversation.language, conversation.prompt_variant
+        )
+    ]
+    if conversation.feeling_array and prompt_service.uses_belief_level(
+        conversation.language, conversation.prompt_variant
+    ):
+        prefix.append(
+            prompt_service.get_belief_level_message(conversation.feeling_array[0].score)
+        )
+    return prefix
+
+
+def _build_llm_messages(conversation, message_text: str) -> list[dict]:
+    """Recent history plus the new user message, in chat-completions format."""
+    recent_history = conversation.history[-(_N_HISTORY_TURNS * 2) :]
+    messages = [{"role": msg.role, "content": msg.content} for msg in recent_history]
+    messages.append({"role": "user", "content": message_text})
+    return messages
@@ -0,0 +1,111 @@
+import difflib
+import re
+from datetime import datetime, timezone
+
+from config import settings
+from database import models
+
+# Brief, neutral re-engage prompts, matching what the system prompts ask the
+# model to say for repeated or content-free messages.
+FAST_PATH_REPLIES = {
+    "EN": {
+        "duplicate": """It looks like that message came through again. Whenever you're ready, I'd like to hear more of your thoughts on Brazil's electronic voting machines.""",
+        "no_content": """I see. Could you tell me a bit more, in words, about what you think of Brazil's electronic voting machines?""",
+        "digits": """Thanks. Could you say a bit more, in words, about what you think of Brazil's electronic voting machines?""",
+    },
+    "PT": {
+        "duplicate": """Parece que essa mensagem chegou de novo. Quando quiser, eu gostaria de ouvir mais sobre o que você pensa das urnas eletrônicas no Brasil.""",
+        "no_content": """Entendi. Você poderia me contar um pouco mais, em palavras, o que pensa sobre as urnas eletrônicas no Brasil?""",
+        "digits": """Obrigado. Você poderia falar um pouco mais, em palavras, sobre o que pensa das urnas eletrônicas no Brasil?""",
+    },
+}
+
+RULES = ("empty", "no_content", "digits", "duplicate")
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def _normalize(text: str) -> str:
+    """Lowercase and drop punctuation/spacing so trivial edits still match."""
+    return _NON_WORD.sub(" ", text.casefold()).strip()
+
+
+def enabled_rules() -> set[str]:
+    return {r.strip() for r in settings.FAST_PATH_RULES.split(",") if r.strip()}
+
+
+def classify(
+    message_text: str, history: list[models.Message], now: datetime | None = None
+) -> str | None:
+    """Return the fast-path rule that matches this message, or None.
+
+    `history` is the conversation's stored history, oldest first.
+
+    Rules (each can be switched off via FAST_PATH_RULES):
+        empty: only whitespace
+        no_content: no letters or digits (emoji, stickers relayed as text, "...")
+        digits: only digits and punctuation, e.g. a stray "7"
+        duplicate: same as, or at least FAST_PATH_SIMILARITY similar to, the
+            user's previous message, sent within the last
+            FAST_PATH_DUPLICATE_WINDOW_SECONDS (see _is_repeat). Messages
+            under FAST_PATH_DUPLICATE_MIN_WORDS words never count: "sim" twice
+            is usually two answers, not a repeat.
+    """
+    rules = enabled_rules()
+    stripped = message_text.strip()
+
+    if not stripped:
+        return "empty" if "empty" in rules else None
+
+    normalized = _normalize(stripped)
+    if not normalized:
+        return "no_content" if "no_content" in rules else None
+
+    if "digits" in rules and normalized.replace(" ", "").isdigit():
+        return "digits"
+
+    if (
+        "duplicate" in rules
+        and len(normalized.split()) >= settings.FAST_PATH_DUPLICATE_MIN_WORDS
+        and _is_repeat(normalized, history, now or datetime.now(timezone.utc))
+    ):
+        return "duplicate"
+
+    return None
+
+
+def _is_repeat(normalized: str, history: list[models.Message], now: datetime) -> bool:
+    """True if `normalized` repeats the user's previous message, sent recently.
+
+    The bot's reply in between doesn't matter: a user resending a message
+    they think didn't go through usually does so after it was answered.
+    """
+    previous = next((m for m in reversed(history) if m.role == "user"), None)
+    if previous is None:
+        return False
+    sent_at = previous.timestamp
+    if sent_at.tzinfo is None:  # Firestore stores naive datetimes as UTC
+        sent_at = sent_at.replace(tzinfo=timezone.utc)
+    if (now - sent_at).total_seconds() > settings.FAST_PATH_DUPLICATE_WINDOW_SECONDS:
+        return False
+
+    previous_text = _normalize(previous.content)
+    if previous_text == normalized:
+        return True
+    matcher = difflib.SequenceMatcher(None, previous_text, normalized)
+    threshold = settings.FAST_PATH_SIMILARITY
+    # Cheap upper bounds first; ratio() is quadratic in message length.
+    return (
+        matcher.real_quick_ratio() >= threshold
+        and matcher.quick_ratio() >= threshold
+        and matcher.ratio() >= threshold
+    )
+
+
+def get_reply(language: str, rule: str) -> str:
+    """Localized canned reply for a fast-path rule."""
+    lang = language.upper()
+    if lang not in FAST_PATH_REPLIES:
+        lang = "EN"
+    key = "no_content" if rule == "empty" else rule
+    return FAST_PATH_REPLIES[lang][key]
@@ -0,0 +1,73 @@
+import dataclasses
+import json
+import logging
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class WhatsAppNumber:
+    """One WhatsApp business phone number served by this process."""
+
+    phone_number_id: str
+    access_token: str
+    flow_id_en: str
+    flow_id_pt: str
+    default_language: str = "PT"
+    # Prefix for this number's Firestore collections; "" uses the plain names.
+    firestore_namespace: str = ""
+
+    @property
+    def messages_url(self) -> str:
+        return f"https://graph.facebook.com/v22.0/{self.phone_number_id}/messages"
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+    @property
+    def json_headers(self) -> dict[str, str]:
+        """Headers for posting an already-serialized JSON body."""
+        return {**self.headers, "Content-Type": "application/json"}
+
+    def flow_id(self, language: str) -> str:
+        return self.flow_id_pt if language.upper() == "PT" else self.flow_id_en
+
+
+def load() -> dict[str, WhatsAppNumber]:
+    """Build the phone_number_id -> WhatsAppNumber registry.
+
+    Reads WHATSAPP_NUMBERS (a JSON list) or the file at WHATSAPP_NUMBERS_FILE.
+    Each entry needs "phone_number_id"; "access_token", "flow_id_en" and
+    "flow_id_pt" default to the single-number settings, and
+    "default_language"/"firestore_namespace" are optional. With neither set,
+    the registry holds just the legacy PHONE_NUMBER_ID.
+    """
+    raw = settings.WHATSAPP_NUMBERS
+    if not raw and settings.WHATSAPP_NUMBERS_FILE:
+        with open(settings.WHATSAPP_NUMBERS_FILE, encoding="utf-8") as f:
+            raw = f.read()
+
+    if not raw:
+        entries = [{"phone_number_id": settings.PHONE_NUMBER_ID}]
+    else:
+        entries = json.loads(raw)
+
+    registry = {}
+    for entry in entries:
+        number = WhatsAppNumber(
+            phone_number_id=str(entry["phone_number_id"]),
+            access_token=entry.get("access_token", settings.ACCESS_TOKEN),
+            flow_id_en=entry.get("flow_id_en", settings.FLOW_ID_EN),
+            flow_id_pt=entry.get("flow_id_pt", settings.FLOW_ID_PT),
+            default_language=entry.get("default_language", "PT").upper(),
+            firestore_namespace=entry.get("firestore_namespace", ""),
+        )
+        if number.phone_number_id in registry:
+            raise ValueError(f"Duplicate phone_number_id {number.phone_number_id}")
+        registry[number.phone_number_id] = number
+
+    logger.info("Serving WhatsApp numbers: %s", ", ".join(registry))
+    return registry
@@ -0,0 +1,106 @@
+"""Graph API message bodies for trust prompts, serialized once per number.
+
+A trust prompt (intro, check-in, ...) is identical for every recipient except
+the "to" field: the text depends only on language and USE_FLOWS, the Flow
+envelope only on the number's flow ID and language. precompute() builds the
+JSON bytes for every combination at startup; sending splices the recipient's
+phone number in between two byte strings instead of rebuilding and
+re-serializing the nested dict.
+"""
+
+import dataclasses
+import json
+from typing import Iterable
+
+from config import settings
+from services import number_registry, trust_service
+
+_RECIPIENT = "\x00to\x00"
+
+
+@dataclasses.dataclass(frozen=True)
+class PayloadTemplate:
+    """A serialized message body with the recipient left out."""
+
+    head: bytes
+    tail: bytes
+
+    def render(self, to_phone: str) -> bytes:
+        return self.head + json.dumps(to_phone)[1:-1].encode() + self.tail
+
+    @classmethod
+    def from_message(cls, message: dict) -> "PayloadTemplate":
+        """Template for `message` (a Graph API body without "to")."""
+        payload = {"messaging_product": "whatsapp", "to": _RECIPIENT, **message}
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        head, tail = body.encode().split(json.dumps(_RECIPIENT).encode())
+        return cls(head=head + b'"', tail=b'"' + tail)
+
+
+def _flow_message(
+    number: number_registry.WhatsAppNumber, language: str, body_text: str
+) -> dict:
+    return {
+        "type": "interactive",
+        "interactive": {
+            "type": "flow",
+            "body": {"text": body_text},
+            "action": {
+                "name": "flow",
+                "parameters": {
+                    "flow_message_version": "3",
+                    "flow_id": number.flow_id(language),
+                    "flow_cta": (
+                        "Avaliar Agora" if language.upper() == "PT" else "Rate Now"
+                    ),
+                    "flow_action": "navigate",
+                    "flow_action_payload": {"screen": "QUESTION_ONE"},
+                },
+            },
+        },
+    }
+
+
+def _text_message(body_text: str) -> dict:
+    return {"type": "text", "text": {"body": body_text}}
+
+
+# (number, language, prompt_key, use_flows) -> template
+_templates: dict[tuple, PayloadTemplate] = {}
+
+
+def _build(number, language: str, prompt_key: str, use_flows: bool) -> PayloadTemplate:
+    body_text = trust_service.get_trust_prompts(use_flows)[language][prompt_key]
+    message = (
+        _flow_message(number, language, body_text)
+        if use_flows
+        else _text_message(body_text)
+    )
+    return PayloadTemplate.from_message(message)
+
+
+def precompute(numbers: Iterable[number_registry.WhatsAppNumber]):
+    """Serialize every trust prompt for every number, language and mode."""
+    for number in numbers:
+        for use_flows in (True, False):
+            for language, by_key in trust_service.get_trust_prompts(use_flows).items():
+                for prompt_key in by_key:
+                    key = (number, language, prompt_key, use_flows)
+                    _templates[key] = _build(number, language, prompt_key, use_flows)
+
+
+def trust_prompt(
+    number: number_registry.WhatsAppNumber, language: str, prompt_key: str
+) -> PayloadTemplate:
+    """The trust prompt body for the current USE_FLOWS mode.
+
+    Languages without prompts fall back to EN, like get_trust_prompt().
+    """
+    language = language.upper()
+    if language not in trust_service.TRUST_PROMPTS:
+        language = "EN"
+    key = (number, language, prompt_key, settings.USE_FLOWS)
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = _build(*key)
+    return template
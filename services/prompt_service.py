@@ -12,6 +12,7 @@ VARIANTS = [
 LANGUAGES = ["EN", "PT"]
 
 _cache: dict[str, str] = {}
+_system_messages: dict[str, dict] = {}
 
 
 def get_prompt(language: str, variant: str) -> str:
@@ -33,6 +34,31 @@ def get_prompt(language: str, variant: str) -> str:
     return _cache[key]
 
 
+def get_system_message(language: str, variant: str) -> dict:
+    """The system prompt as a chat message, built once per variant.
+
+    It is the first message of every request for this variant, so it forms
+    the prefix the provider's prompt cache can reuse across users.
+    """
+    key = variant
+    if key not in _system_messages:
+        _system_messages[key] = {
+            "role": "system",
+            "content": get_prompt(language=language, variant=variant),
+        }
+    return _system_messages[key]
+
+
+def uses_belief_level(language: str, variant: str) -> bool:
+    """True if the variant's prompt refers to user_belief_level."""
+    return "user_belief_level" in get_prompt(language=language, variant=variant)
+
+
+def get_belief_level_message(score: int) -> dict:
+    """The per-user belief level, sent right after the shared system prompt."""
+    return {"role": "system", "content": f"user_belief_level = {score}"}
+
+
 def assign_variant() -> str:
     """Randomly assign a variant for A/B testing."""
     return random.choice(VARIANTS)
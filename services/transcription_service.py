@@ -0,0 +1,135 @@
+import asyncio
+import collections
+import functools
+import hashlib
+import time
+from typing import Awaitable, Callable
+
+import metrics
+from config import settings
+from database import firebase, write_behind
+from integrations import openai_client
+
+# Bounded LRU of cache key -> {"transcript", "whisper_seconds", "phone_number"}
+# (whose voice note it was, for forget()). Keys are
+# "media:<media_id>" (webhook redeliveries) and "sha256:<hex>" (the same voice
+# note forwarded again, which gets a new media_id).
+_cache: collections.OrderedDict[str, dict] = collections.OrderedDict()
+
+
+async def transcribe_voice_note(
+    client,
+    phone_number: str,
+    media_id: str,
+    download: Callable[[str], Awaitable[bytes]],
+) -> str:
+    """Return the transcript for a WhatsApp voice note, using the cache if possible.
+
+    Args:
+        client: Firestore client (used for the optional shared cache tier)
+        phone_number: sender of the voice note; new cache entries belong to them
+        media_id: WhatsApp media ID of the voice note
+        download: coroutine function that fetches the audio bytes for a media ID
+
+    A media_id hit skips both the download and Whisper; an audio-hash hit
+    skips Whisper. Firestore-tier lookups run in a worker thread, and new
+    entries are saved there through write_behind, off the reply path.
+    """
+    media_key = f"media:{media_id}"
+    entry = await _lookup(client, media_key)
+    if entry is not None:
+        return entry["transcript"]
+
+    audio_bytes = await download(media_id)
+    hash_key = f"sha256:{hashlib.sha256(audio_bytes).hexdigest()}"
+    entry = await _lookup(client, hash_key)
+    if entry is not None:
+        _store(client, media_key, {**entry, "phone_number": phone_number})
+        return entry["transcript"]
+
+    metrics.increment("transcription_cache.misses")
+    start = time.perf_counter()
+    transcript = await openai_client.transcribe_audio(audio_bytes)
+    entry = {
+        "transcript": transcript,
+        "whisper_seconds": time.perf_counter() - start,
+        "phone_number": phone_number,
+    }
+    _store(client, hash_key, entry)
+    _store(client, media_key, entry)
+    return transcript
+
+
+def forget(phone_number: str):
+    """Drop this user's transcripts from the cache (part of deleting their data).
+
+    Clears this instance's memory tier; the Firestore tier is purged by
+    firebase.delete_conversation(). Other instances' memory tiers keep
+    theirs until they age out of the LRU.
+    """
+    for key in [k for k, e in _cache.items() if e["phone_number"] == phone_number]:
+        del _cache[key]
+
+
+def stats() -> dict[str, float]:
+    """Hit rate and Whisper time saved since process start."""
+    hits = sum(metrics.snapshot("transcription_cache.hits.").values())
+    misses = metrics.get("transcription_cache.misses")
+    lookups = hits + misses
+    return {
+        "transcription_cache.hit_rate": hits / lookups if lookups else 0.0,
+        "transcription_cache.whisper_seconds_saved": metrics.get(
+            "transcription_cache.whisper_seconds_saved"
+        ),
+        "transcription_cache.size": len(_cache),
+    }
+
+
+async def _lookup(client, key: str) -> dict | None:
+    tier = "memory"
+    entry = _cache.get(key)
+    if entry is not None:
+        _cache.move_to_end(key)
+    elif settings.TRANSCRIPT_CACHE_FIRESTORE:
+        tier = "firestore"
+        entry = await asyncio.to_thread(firebase.get_cached_transcript, client, key)
+        if entry is not None:
+            _remember(key, entry)
+
+    if entry is None:
+        return None
+    kind = key.split(":", 1)[0]
+    metrics.increment(f"transcription_cache.hits.{tier}.{kind}")
+    metrics.increment(
+        "transcription_cache.whisper_seconds_saved", entry.get("whisper_seconds", 0)
+    )
+    return entry
+
+
+def _store(client, key: str, entry: dict):
+    _remember(key, entry)
+    if settings.TRANSCRIPT_CACHE_FIRESTORE:
+        write_behind.submit(
+            f"transcripts:{key}",
+            [
+                functools.partial(
+                    firebase.save_cached_transcript,
+                    client,
+                    key,
+                    entry["transcript"],
+                    entry["whisper_seconds"],
+                    entry["phone_number"],
+                )
+            ],
+        )
+
+
+def _remember(key: str, entry: dict):
+    _cache[key] = {
+        "transcript": entry["transcript"],
+        "whisper_seconds": entry.get("whisper_seconds", 0),
+        "phone_number": entry.get("phone_number", ""),
+    }
+    _cache.move_to_end(key)
+    while len(_cache) > settings.TRANSCRIPT_CACHE_SIZE:
+        _cache.popitem(last=False)
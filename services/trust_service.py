@@ -51,6 +51,48 @@ def should_trigger_check_in(user_turn_count: int) -> bool:
     return user_turn_count > 0 and user_turn_count % interval == 0
 
 
+# Wording tweaks for text mode, where there's no Flow button to tap.
+_TEXT_MODE_REPLACEMENTS = [
+    (
+        "Please select your rating from the list below.",
+        "Please reply with a number from 1 to 10.",
+    ),
+    (
+        "please use the list below to select your rating.",
+        "please reply with a number from 1 to 10.",
+    ),
+    (
+        "Por favor, selecione sua avaliacao na lista abaixo.",
+        "Por favor, responda com um numero de 1 a 10.",
+    ),
+    (
+        "Por favor, use a lista abaixo para selecionar sua avaliacao.",
+        "Por favor, responda com um numero de 1 a 10.",
+    ),
+]
+
+
+def _text_mode(prompt: str) -> str:
+    for old, new in _TEXT_MODE_REPLACEMENTS:
+        prompt = prompt.replace(old, new)
+    return prompt
+
+
+# use_flows -> language -> prompt_key -> text, built once at import.
+_PROMPTS_BY_MODE = {
+    True: TRUST_PROMPTS,
+    False: {
+        lang: {key: _text_mode(prompt) for key, prompt in prompts.items()}
+        for lang, prompts in TRUST_PROMPTS.items()
+    },
+}
+
+
+def get_trust_prompts(use_flows: bool) -> dict[str, dict[str, str]]:
+    """All prompts for one USE_FLOWS mode: language -> prompt_key -> text."""
+    return _PROMPTS_BY_MODE[use_flows]
+
+
 def get_trust_prompt(language: str, prompt_key: str) -> str:
     """Get a trust-related prompt string for the given language.
 
@@ -58,27 +100,5 @@ def get_trust_prompt(language: str, prompt_key: str) -> str:
         language: "EN" or "PT"
         prompt_key: "intro", "invalid", "check_in", or "rating_received"
     """
-    lang = language.upper()
-    if lang not in TRUST_PROMPTS:
-        lang = "EN"
-    prompt = TRUST_PROMPTS[lang][prompt_key]
-    if not settings.USE_FLOWS:
-        prompt = (
-            prompt.replace(
-                "Please select your rating from the list below.",
-                "Please reply with a number from 1 to 10.",
-            )
-            .replace(
-                "please use the list below to select your rating.",
-                "please reply with a number from 1 to 10.",
-            )
-            .replace(
-                "Por favor, selecione sua avaliacao na lista abaixo.",
-                "Por favor, responda com um numero de 1 a 10.",
-            )
-            .replace(
-                "Por favor, use a lista abaixo para selecionar sua avaliacao.",
-                "Por favor, responda com um numero de 1 a 10.",
-            )
-        )
-    return prompt
+    prompts = _PROMPTS_BY_MODE[settings.USE_FLOWS]
+    return prompts.get(language.upper(), prompts["EN"])[prompt_key]
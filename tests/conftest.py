@@ -0,0 +1,11 @@
+"""Shared setup for the unit tests (no network, no Firestore project).
+
+Run from project root:
+    uv run pytest tests/ -v
+"""
+
+import os
+
+# integrations/openai_client builds its client at import time; the unit tests
+# never call the API, but the constructor insists on a key.
+os.environ.setdefault("OPENAI_API_KEY", "test-key-unused")
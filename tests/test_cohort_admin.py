@@ -0,0 +1,205 @@
+import datetime as dt
+
+import pytest
+
+from database import firebase, local_store, models
+from tools import cohort_admin
+from tools.cohort_admin import Selection
+
+UTC = dt.timezone.utc
+MARCH = dt.datetime(2026, 3, 1, tzinfo=UTC)
+
+
+def _add(client, phone, language="PT", phase="normal", updated_at=MARCH):
+    conversation = models.Conversation(
+        phone_number=phone,
+        last_message="",
+        language=language,
+        prompt_variant=f"{language}_prompt_A_control_condition",
+        conversation_phase=phase,
+        updated_at=updated_at,
+    )
+    firebase.conversation_ref(client, phone).set(conversation.to_firestore())
+
+
+def _phases(client) -> dict:
+    return {
+        doc.to_dict()["phone_number"]: doc.to_dict()["conversation_phase"]
+        for doc in client.collection("conversations").stream()
+    }
+
+
+def _run(client, selection, operation, job="job", **kwargs):
+    kwargs.setdefault("max_per_second", 1000)
+    return cohort_admin.run(client, selection, operation, job, **kwargs)
+
+
+@pytest.fixture
+def cohort():
+    """Ten conversations: even phones in EN, every third awaiting a rating,
+    updated one day apart from March 1st."""
+    client = local_store.LocalClient()
+    for i in range(10):
+        _add(
+            client,
+            f"55110000000{i:02d}",
+            language="EN" if i % 2 == 0 else "PT",
+            phase="awaiting_initial_rating" if i % 3 == 0 else "normal",
+            updated_at=MARCH + dt.timedelta(days=i),
+        )
+    return client
+
+
+def test_selection_combines_filters_and_updated_at_range(cohort):
+    selection = Selection(
+        language="EN",
+        conversation_phase="normal",
+        updated_after=MARCH + dt.timedelta(days=2),
+        updated_before=MARCH + dt.timedelta(days=8),
+    )
+
+    result = _run(
+        cohort, selection, cohort_admin.set_phase_op("awaiting_check_in_rating")
+    )
+
+    # EN and normal: 2, 4, 8; the range keeps days 2..7.
+    assert result["matched"] == 2
+    changed = {
+        phone
+        for phone, phase in _phases(cohort).items()
+        if phase == "awaiting_check_in_rating"
+    }
+    assert changed == {"5511000000002", "5511000000004"}
+
+
+def test_naive_updated_at_is_read_as_utc():
+    client = local_store.LocalClient()
+    _add(client, "5511000000001", updated_at=dt.datetime(2026, 3, 1, 12))
+    selection = Selection(updated_after=dt.datetime(2026, 3, 1, 11, tzinfo=UTC))
+
+    assert _run(client, selection, None, dry_run=True)["matched"] == 1
+
+
+def test_dry_run_counts_without_writing(cohort, tmp_path):
+    checkpoint_path = tmp_path / "checkpoint.json"
+    before = _phases(cohort)
+
+    result = _run(
+        cohort,
+        Selection(language="PT"),
+        cohort_admin.delete_op(cohort),
+        checkpoint_path=str(checkpoint_path),
+        page_size=3,
+        dry_run=True,
+    )
+
+    assert (result["scanned"], result["matched"], result["failed"]) == (5, 5, 0)
+    assert _phases(cohort) == before
+    assert not checkpoint_path.exists()
+
+
+def test_resumes_from_checkpoint(cohort, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    operation = cohort_admin.set_phase_op("awaiting_check_in_rating")
+    writes = []
+
+    def interrupted(writer, doc):
+        if len(writes) == 3:
+            raise KeyboardInterrupt
+        writes.append(doc.id)
+        operation(writer, doc)
+
+    with pytest.raises(KeyboardInterrupt):
+        _run(
+            cohort,
+            Selection(language="PT"),
+            interrupted,
+            checkpoint_path=checkpoint_path,
+            page_size=2,
+        )
+    # Only the first page was flushed and checkpointed.
+    assert sum(p == "awaiting_check_in_rating" for p in _phases(cohort).values()) == 2
+
+    resumed = []
+
+    def counting(writer, doc):
+        resumed.append(doc.id)
+        operation(writer, doc)
+
+    result = _run(
+        cohort,
+        Selection(language="PT"),
+        counting,
+        checkpoint_path=checkpoint_path,
+        page_size=2,
+    )
+
+    assert result["matched"] == 5
+    assert set(resumed).isdisjoint(writes[:2])
+    assert len(resumed) == 3
+    phases = _phases(cohort)
+    assert all(
+        phases[phone] == "awaiting_check_in_rating"
+        for phone in phases
+        if int(phone) % 2 == 1
+    )
+
+
+def test_refuses_another_jobs_checkpoint(cohort, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    cohort_admin.checkpoints.save(
+        checkpoint_path,
+        {"job": "other", "last_doc_id": None, "scanned": 0, "matched": 0, "failed": 0},
+    )
+
+    with pytest.raises(ValueError, match="belongs to 'other'"):
+        _run(
+            cohort,
+            Selection(language="PT"),
+            cohort_admin.delete_op(cohort),
+            checkpoint_path=checkpoint_path,
+        )
+    assert len(_phases(cohort)) == 10
+
+
+def test_counts_writes_that_keep_failing(cohort):
+    def update_missing(writer, doc):
+        missing = cohort.collection("conversations").document(f"gone_{doc.id}")
+        writer.update(missing, {"conversation_phase": "normal"})
+
+    result = _run(cohort, Selection(language="EN"), update_missing, max_attempts=3)
+
+    assert result["matched"] == 5
+    assert result["failed"] == 5
+
+
+def test_write_failures_keeps_conflicts_apart():
+    failures = cohort_admin.WriteFailures(max_attempts=2)
+    reference = local_store.LocalClient().collection("c").document("d")
+
+    def failure(code, attempts):
+        operation = local_store.LocalBulkWriterOperation(reference, attempts)
+        return local_store.LocalBulkWriteFailure(operation, code, "boom")
+
+    unavailable = 14
+    assert failures(failure(unavailable, 1), None) is True
+    assert failures(failure(unavailable, 2), None) is False
+    assert failures(failure(cohort_admin._FAILED_PRECONDITION, 1), None) is False
+
+    assert failures.take() == (["c/d"], ["c/d"])
+    assert failures.take() == ([], [])
+
+
+def test_delete_removes_the_users_transcripts():
+    client = local_store.LocalClient()
+    _add(client, "5511000000001")
+    _add(client, "5511000000002", language="EN")
+    firebase.save_cached_transcript(client, "a", "olá", 1.0, "5511000000001")
+    firebase.save_cached_transcript(client, "b", "hello", 1.0, "5511000000002")
+
+    result = _run(client, Selection(language="PT"), cohort_admin.delete_op(client))
+
+    assert result["matched"] == 1
+    assert list(_phases(client)) == ["5511000000002"]
+    remaining = [doc.id for doc in client.collection("transcripts").stream()]
+    assert remaining == ["b"]
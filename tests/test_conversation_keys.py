@@ -0,0 +1,152 @@
+import datetime as dt
+
+import pytest
+
+from config import settings
+from database import firebase, local_store, models
+
+PHONE = "5511999990000"
+
+
+@pytest.fixture(autouse=True)
+def hashed_keys(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_KEY_SCHEME", "hashed")
+    monkeypatch.setattr(settings, "CONVERSATION_KEY_MIGRATE_ON_READ", True)
+
+
+def _conversation(last_message: str) -> dict:
+    return models.Conversation(
+        phone_number=PHONE, last_message=last_message
+    ).to_firestore()
+
+
+def _doc_ids(client) -> list[str]:
+    return [doc.id for doc in client.collection("conversations").stream()]
+
+
+def test_conversation_doc_id_prefixes_a_hash():
+    doc_id = firebase.conversation_doc_id(PHONE)
+    assert doc_id.endswith(f"_{PHONE}")
+    assert len(doc_id) == len(PHONE) + 5
+    assert firebase.conversation_doc_id(PHONE) == doc_id
+    assert not firebase.is_legacy_doc_id(doc_id)
+
+
+def test_conversation_doc_id_spreads_sequential_numbers():
+    prefixes = {
+        firebase.conversation_doc_id(f"55119999{i:05d}")[:4] for i in range(100)
+    }
+    assert len(prefixes) > 90
+
+
+def test_conversation_doc_id_raw_scheme(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_KEY_SCHEME", "raw")
+    assert firebase.conversation_doc_id(PHONE) == PHONE
+    assert firebase.is_legacy_doc_id(PHONE)
+
+
+@pytest.mark.parametrize("phone", [PHONE, "15551234567", "447700900123"])
+def test_phone_number_from_doc_id_round_trips(phone):
+    assert (
+        firebase.phone_number_from_doc_id(firebase.conversation_doc_id(phone)) == phone
+    )
+    assert firebase.phone_number_from_doc_id(phone) == phone
+
+
+def test_migrate_when_only_legacy_exists():
+    client = local_store.LocalClient()
+    client.collection("conversations").document(PHONE).set(_conversation("legacy"))
+
+    assert firebase.migrate_conversation_key(client, PHONE)
+
+    assert _doc_ids(client) == [firebase.conversation_doc_id(PHONE)]
+    data = firebase.conversation_ref(client, PHONE).get().to_dict()
+    assert data["last_message"] == "legacy"
+    assert data["phone_number"] == PHONE
+
+
+def test_migrate_when_both_exist_keeps_the_hashed_document():
+    client = local_store.LocalClient()
+    client.collection("conversations").document(PHONE).set(_conversation("legacy"))
+    firebase.conversation_ref(client, PHONE).set(_conversation("current"))
+
+    assert firebase.migrate_conversation_key(client, PHONE)
+
+    assert _doc_ids(client) == [firebase.conversation_doc_id(PHONE)]
+    data = firebase.conversation_ref(client, PHONE).get().to_dict()
+    assert data["last_message"] == "current"
+
+
+def test_migrate_when_both_exist_merges_legacy_history_and_ratings():
+    start = dt.datetime(2026, 3, 1, tzinfo=dt.timezone.utc)
+
+    def message(content, minute):
+        return models.Message(
+            role="user", content=content, timestamp=start + dt.timedelta(minutes=minute)
+        ).model_dump(exclude_none=True)
+
+    client = local_store.LocalClient()
+    shared = message("before the deploy", 0)
+    current = _conversation("current")
+    current["history"] = [shared, message("on the new instance", 2)]
+    legacy = _conversation("legacy")
+    legacy["history"] = [shared, message("on an old instance", 1)]
+    legacy["feeling_array"] = [
+        models.TrustRating(score=6, message_index=3, timestamp=start).model_dump()
+    ]
+    client.collection("conversations").document(PHONE).set(legacy)
+    firebase.conversation_ref(client, PHONE).set(current)
+
+    assert firebase.migrate_conversation_key(client, PHONE)
+
+    assert _doc_ids(client) == [firebase.conversation_doc_id(PHONE)]
+    data = firebase.conversation_ref(client, PHONE).get().to_dict()
+    assert [m["content"] for m in data["history"]] == [
+        "before the deploy",
+        "on an old instance",
+        "on the new instance",
+    ]
+    assert [r["score"] for r in data["feeling_array"]] == [6]
+    assert data["last_message"] == "current"
+
+
+def test_migrate_without_legacy_document():
+    client = local_store.LocalClient()
+    assert not firebase.migrate_conversation_key(client, PHONE)
+    assert _doc_ids(client) == []
+
+
+def test_migrate_is_a_no_op_for_raw_scheme(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_KEY_SCHEME", "raw")
+    client = local_store.LocalClient()
+    client.collection("conversations").document(PHONE).set(_conversation("legacy"))
+
+    assert not firebase.migrate_conversation_key(client, PHONE)
+    assert _doc_ids(client) == [PHONE]
+
+
+def test_get_or_create_migrates_legacy_conversation_on_read():
+    client = local_store.LocalClient()
+    client.collection("conversations").document(PHONE).set(_conversation("legacy"))
+
+    convo = firebase.get_or_create_conversation(
+        client, PHONE, "PT", "PT_prompt_A_control_condition"
+    )
+
+    assert convo.last_message == "legacy"
+    assert _doc_ids(client) == [firebase.conversation_doc_id(PHONE)]
+
+
+def test_get_or_create_skips_legacy_lookup_when_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_KEY_MIGRATE_ON_READ", False)
+    client = local_store.LocalClient()
+    client.collection("conversations").document(PHONE).set(_conversation("legacy"))
+
+    convo = firebase.get_or_create_conversation(
+        client, PHONE, "PT", "PT_prompt_A_control_condition"
+    )
+
+    assert convo.last_message == ""
+    assert sorted(_doc_ids(client)) == sorted(
+        [PHONE, firebase.conversation_doc_id(PHONE)]
+    )
@@ -0,0 +1,185 @@
+import datetime as dt
+
+import pytest
+
+import metrics
+from bench import fakes
+from config import settings
+from database import firebase, local_store, models
+from services import conversation_service, fast_path_service
+from services.fast_path_service import classify
+
+PHONE = "5511999990000"
+NOW = dt.datetime(2026, 3, 1, 12, 0, tzinfo=dt.timezone.utc)
+QUESTION = "I think the machines can be hacked"
+
+
+@pytest.fixture(autouse=True)
+def default_rules(monkeypatch):
+    monkeypatch.setattr(
+        settings, "FAST_PATH_RULES", "empty,no_content,digits,duplicate"
+    )
+    monkeypatch.setattr(settings, "FAST_PATH_DUPLICATE_MIN_WORDS", 3)
+    monkeypatch.setattr(settings, "FAST_PATH_DUPLICATE_WINDOW_SECONDS", 600)
+    monkeypatch.setattr(settings, "FAST_PATH_SIMILARITY", 0.9)
+
+
+def _message(role: str, content: str, seconds_ago: float = 30) -> models.Message:
+    return models.Message(
+        role=role, content=content, timestamp=NOW - dt.timedelta(seconds=seconds_ago)
+    )
+
+
+@pytest.mark.parametrize("text", ["", "   ", "\n\t"])
+def test_empty(text):
+    assert classify(text, [], NOW) == "empty"
+
+
+@pytest.mark.parametrize("text", ["👍", "🙏🙏", "...", "?!"])
+def test_emoji_and_punctuation_only(text):
+    assert classify(text, [], NOW) == "no_content"
+
+
+@pytest.mark.parametrize("text", ["7", " 10 ", "7/10", "1.5"])
+def test_digits(text):
+    assert classify(text, [], NOW) == "digits"
+
+
+def test_repeat_after_the_llm_answered_is_duplicate():
+    history = [
+        _message("user", QUESTION, seconds_ago=60),
+        _message("assistant", "Why do you feel that way?", seconds_ago=55),
+    ]
+    assert classify(QUESTION, history, NOW) == "duplicate"
+
+
+def test_near_duplicate_ignores_case_and_punctuation():
+    history = [_message("user", "I think the machines can be hacked!")]
+    assert classify("i think the machines can be hacked", history, NOW) == "duplicate"
+    assert classify("I think the machine can be hacked", history, NOW) == "duplicate"
+
+
+def test_repeat_outside_the_window_is_not_duplicate():
+    history = [_message("user", QUESTION, seconds_ago=601)]
+    assert classify(QUESTION, history, NOW) is None
+
+
+def test_naive_timestamps_are_treated_as_utc():
+    sent_at = (NOW - dt.timedelta(seconds=30)).replace(tzinfo=None)
+    history = [models.Message(role="user", content=QUESTION, timestamp=sent_at)]
+    assert classify(QUESTION, history, NOW) == "duplicate"
+
+
+def test_only_the_previous_user_message_is_compared():
+    history = [
+        _message("user", QUESTION),
+        _message("assistant", "Why?"),
+        _message("user", "Nobody audits the code"),
+        _message("assistant", "What makes you say that?"),
+    ]
+    assert classify(QUESTION, history, NOW) is None
+
+
+@pytest.mark.parametrize("text", ["sim", "não", "ok", "não sei", "Sim!"])
+def test_short_answers_are_never_duplicates(text):
+    history = [_message("user", text), _message("assistant", "And why is that?")]
+    assert classify(text, history, NOW) is None
+
+
+def test_different_message_is_not_a_match():
+    history = [_message("user", QUESTION)]
+    assert classify("Who checks the software before elections?", history, NOW) is None
+
+
+@pytest.mark.parametrize(
+    "text, rule",
+    [("", "empty"), ("👍", "no_content"), ("7", "digits"), (QUESTION, "duplicate")],
+)
+def test_rules_can_be_disabled(monkeypatch, text, rule):
+    history = [_message("user", QUESTION)]
+    assert classify(text, history, NOW) == rule
+    enabled = [r for r in fast_path_service.RULES if r != rule]
+    monkeypatch.setattr(settings, "FAST_PATH_RULES", ",".join(enabled))
+    assert classify(text, history, NOW) is None
+
+
+def test_all_rules_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "FAST_PATH_RULES", "")
+    assert classify("", [], NOW) is None
+    assert classify("👍", [], NOW) is None
+    assert classify("7", [], NOW) is None
+
+
+# The same checks through real turns: history as the app writes it.
+
+
+@pytest.fixture
+def turns(monkeypatch):
+    """Run a normal-phase turn and apply its writes, like process_whatsapp_ai."""
+    llm_calls = []
+
+    async def completion(messages, cache_key=None):
+        llm_calls.append(messages[-1]["content"])
+        return await fakes.fake_completion(messages, cache_key)
+
+    monkeypatch.setattr(
+        conversation_service.openai_client, "get_completion", completion
+    )
+    monkeypatch.setattr(settings, "TRUST_CHECK_INTERVAL", 100)
+    metrics.reset()
+    client = local_store.LocalClient()
+    doc = fakes.conversation_doc(0)
+    doc["phone_number"] = PHONE
+    firebase.conversation_ref(client, PHONE).set(doc)
+
+    async def send(text: str) -> conversation_service.BotResponse:
+        response = await conversation_service.handle_incoming_message(
+            client, PHONE, text, "text"
+        )
+        for write in response.pending_writes:
+            write()
+        return response
+
+    send.llm_calls = llm_calls
+    return send
+
+
+@pytest.mark.asyncio
+async def test_resend_after_llm_reply_skips_the_llm(turns):
+    first = await turns(QUESTION)
+    second = await turns(QUESTION)
+
+    assert first.text_messages == [fakes.FAKE_AI_REPLY]
+    assert second.text_messages == [fast_path_service.get_reply("PT", "duplicate")]
+    assert turns.llm_calls == [QUESTION]
+    assert metrics.get("fast_path.llm_calls_avoided.duplicate") == 1
+
+
+@pytest.mark.asyncio
+async def test_repeated_short_answers_reach_the_llm(turns):
+    await turns("sim")
+    await turns("sim")
+
+    assert turns.llm_calls == ["sim", "sim"]
+    assert metrics.get("fast_path.llm_calls_avoided.duplicate") == 0
+
+
+@pytest.mark.asyncio
+async def test_new_message_after_a_duplicate_reaches_the_llm(turns):
+    await turns(QUESTION)
+    await turns(QUESTION)
+    await turns("Who audits the software before the elections?")
+
+    assert turns.llm_calls == [
+        QUESTION,
+        "Who audits the software before the elections?",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_resend_outside_the_window_reaches_the_llm(turns, monkeypatch):
+    await turns(QUESTION)
+    monkeypatch.setattr(settings, "FAST_PATH_DUPLICATE_WINDOW_SECONDS", 0)
+    await turns(QUESTION)
+
+    assert turns.llm_calls == [QUESTION, QUESTION]
@@ -0,0 +1,33 @@
+import pytest
+
+from database import models
+from services import conversation_service, prompt_service
+
+
+def _conversation(language: str, variant: str) -> models.Conversation:
+    return models.Conversation(
+        phone_number="5511999990000",
+        last_message="",
+        language=language,
+        prompt_variant=f"{language}_prompt_{variant}",
+        conversation_phase="normal",
+        feeling_array=[models.TrustRating(score=4, message_index=0)],
+    )
+
+
+@pytest.mark.parametrize("variant", prompt_service.VARIANTS)
+def test_en_prompts_get_the_belief_level(variant):
+    prefix = conversation_service._build_prompt_prefix(_conversation("EN", variant))
+    assert prefix[1:] == [{"role": "system", "content": "user_belief_level = 4"}]
+
+
+@pytest.mark.parametrize("variant", prompt_service.VARIANTS)
+def test_pt_prompts_are_sent_unchanged(variant):
+    conversation = _conversation("PT", variant)
+    prefix = conversation_service._build_prompt_prefix(conversation)
+    assert prefix == [
+        {
+            "role": "system",
+            "content": prompt_service.get_prompt("PT", conversation.prompt_variant),
+        }
+    ]
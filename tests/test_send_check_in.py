@@ -0,0 +1,172 @@
+import asyncio
+import datetime as dt
+
+import pytest
+
+from database import firebase, local_store, models
+from services import check_in_campaign, conversation_service
+from tools import send_check_in
+from tools.cohort_admin import Selection
+
+PHONES = ["5511000000001", "5511000000002", "5511000000003"]
+LONG_AGO = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=2)
+
+
+def _add(client, phone, updated_at=LONG_AGO, phase="normal"):
+    conversation = models.Conversation(
+        phone_number=phone,
+        last_message="",
+        conversation_phase=phase,
+        feeling_array=[models.TrustRating(score=5, message_index=0)],
+        user_turn_count=3,
+        updated_at=updated_at,
+    )
+    firebase.conversation_ref(client, phone).set(conversation.to_firestore())
+
+
+def _data(client, phone) -> dict:
+    return firebase.conversation_ref(client, phone).get().to_dict()
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    """Fake send_batch; phones in `graph.reject` are not accepted."""
+
+    async def send_batch(number, recipients, **kwargs):
+        phones = [phone for phone, _ in recipients]
+        graph.sent.extend(phones)
+        return [phone for phone in phones if phone not in graph.reject]
+
+    graph.sent = []
+    graph.reject = set()
+    monkeypatch.setattr(check_in_campaign, "send_batch", send_batch)
+    return graph
+
+
+def test_marks_and_sends_idle_normal_conversations(graph):
+    client = local_store.LocalClient()
+    for phone in PHONES:
+        _add(client, phone)
+
+    totals = send_check_in.run(client, None, Selection())
+
+    assert totals == {"matched": 3, "skipped": 0, "sent": 3, "failed": 0}
+    assert sorted(graph.sent) == PHONES
+    data = _data(client, PHONES[0])
+    assert data["conversation_phase"] == "awaiting_check_in_rating"
+    assert data["check_in_source"] == "campaign"
+    assert data["pending_ai_response"] == check_in_campaign.follow_up("PT")
+
+
+def test_rerun_sends_nobody_twice(graph):
+    client = local_store.LocalClient()
+    for phone in PHONES:
+        _add(client, phone)
+
+    send_check_in.run(client, None, Selection())
+    totals = send_check_in.run(client, None, Selection())
+
+    assert totals["matched"] == 0
+    assert sorted(graph.sent) == PHONES
+
+
+def test_recently_active_conversations_are_left_out(graph):
+    client = local_store.LocalClient()
+    _add(client, PHONES[0])
+    _add(client, PHONES[1], updated_at=dt.datetime.now(dt.timezone.utc))
+
+    totals = send_check_in.run(client, None, Selection())
+
+    assert totals["matched"] == 1
+    assert graph.sent == [PHONES[0]]
+    assert _data(client, PHONES[1])["conversation_phase"] == "normal"
+
+
+def test_conversation_changed_after_the_scan_is_skipped(graph, monkeypatch):
+    client = local_store.LocalClient()
+    for phone in PHONES:
+        _add(client, phone)
+    follow_up = check_in_campaign.follow_up
+
+    def reply_lands_meanwhile(language):
+        # A turn's write-behind updates the first conversation mid-run.
+        firebase.update_conversation_phase(client, PHONES[0], "normal", 4)
+        monkeypatch.setattr(check_in_campaign, "follow_up", follow_up)
+        return follow_up(language)
+
+    monkeypatch.setattr(check_in_campaign, "follow_up", reply_lands_meanwhile)
+
+    totals = send_check_in.run(client, None, Selection())
+
+    assert totals == {"matched": 3, "skipped": 1, "sent": 2, "failed": 0}
+    assert sorted(graph.sent) == PHONES[1:]
+    data = _data(client, PHONES[0])
+    assert data["conversation_phase"] == "normal"
+    assert not data.get("check_in_source")
+
+
+def test_rejected_sends_are_rolled_back(graph):
+    client = local_store.LocalClient()
+    for phone in PHONES:
+        _add(client, phone)
+    graph.reject = {PHONES[2]}
+
+    totals = send_check_in.run(client, None, Selection())
+
+    assert totals == {"matched": 3, "skipped": 0, "sent": 2, "failed": 1}
+    data = _data(client, PHONES[2])
+    assert data["conversation_phase"] == "normal"
+    assert data["pending_ai_response"] == ""
+    assert not data.get("check_in_source")
+
+
+def test_campaign_rating_is_recorded_and_followed_up(graph):
+    client = local_store.LocalClient()
+    _add(client, PHONES[0])
+    send_check_in.run(client, None, Selection())
+
+    async def rate():
+        return await conversation_service.handle_incoming_message(
+            client, PHONES[0], "rating_8", "interactive"
+        )
+
+    response = asyncio.run(rate())
+    for write in response.pending_writes:
+        write()
+
+    assert response.text_messages == [check_in_campaign.follow_up("PT")]
+    data = _data(client, PHONES[0])
+    assert [(r["score"], r.get("source")) for r in data["feeling_array"]] == [
+        (5, None),
+        (8, "campaign"),
+    ]
+    assert data["conversation_phase"] == "normal"
+    assert not data.get("check_in_source")
+
+
+def test_dry_run_writes_nothing(graph):
+    client = local_store.LocalClient()
+    for phone in PHONES:
+        _add(client, phone)
+
+    totals = send_check_in.run(client, None, Selection(), dry_run=True)
+
+    assert totals["matched"] == 3
+    assert graph.sent == []
+    assert _data(client, PHONES[0])["conversation_phase"] == "normal"
+
+
+def test_normal_turn_clears_a_campaign_mark_it_overwrote():
+    client = local_store.LocalClient()
+    _add(client, PHONES[0])
+    firebase.conversation_ref(client, PHONES[0]).update({"check_in_source": "campaign"})
+
+    async def turn():
+        return await conversation_service.handle_incoming_message(
+            client, PHONES[0], "👍", "text"
+        )
+
+    for write in asyncio.run(turn()).pending_writes:
+        write()
+
+    assert not _data(client, PHONES[0]).get("check_in_source")
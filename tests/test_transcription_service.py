@@ -0,0 +1,86 @@
+import datetime as dt
+
+import pytest
+
+from config import settings
+from database import firebase, local_store, write_behind
+from services import transcription_service
+
+PHONE = "5511999990000"
+OTHER_PHONE = "5511999990001"
+
+
+@pytest.fixture(autouse=True)
+def firestore_tier(monkeypatch):
+    monkeypatch.setattr(settings, "TRANSCRIPT_CACHE_FIRESTORE", True)
+    monkeypatch.setattr(settings, "TRANSCRIPT_CACHE_TTL_DAYS", 30)
+    transcription_service._cache.clear()
+    whisper_calls = []
+
+    async def transcribe_audio(audio_bytes):
+        whisper_calls.append(audio_bytes)
+        return f"transcript of {audio_bytes.decode()}"
+
+    monkeypatch.setattr(
+        transcription_service.openai_client, "transcribe_audio", transcribe_audio
+    )
+    yield whisper_calls
+    transcription_service._cache.clear()
+
+
+async def _download(media_id: str) -> bytes:
+    return f"audio {media_id}".encode()
+
+
+async def _transcribe(client, phone, media_id):
+    transcript = await transcription_service.transcribe_voice_note(
+        client, phone, media_id, _download
+    )
+    await write_behind.flush()
+    return transcript
+
+
+def _entries(client) -> dict:
+    return {doc.id: doc.to_dict() for doc in client.collection("transcripts").stream()}
+
+
+@pytest.mark.asyncio
+async def test_entries_record_owner_and_expiry():
+    client = local_store.LocalClient()
+    await _transcribe(client, PHONE, "m1")
+
+    entries = _entries(client)
+    assert len(entries) == 2  # media_id and audio hash
+    for entry in entries.values():
+        assert entry["phone_number"] == PHONE
+        ttl = entry["expires_at"] - dt.datetime.now(dt.timezone.utc)
+        assert dt.timedelta(days=29) < ttl <= dt.timedelta(days=30)
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_misses(firestore_tier):
+    client = local_store.LocalClient()
+    await _transcribe(client, PHONE, "m1")
+    for doc_id in _entries(client):
+        client.collection("transcripts").document(doc_id).update(
+            {"expires_at": dt.datetime.now(dt.timezone.utc)}
+        )
+    transcription_service._cache.clear()
+
+    await _transcribe(client, PHONE, "m1")
+    assert len(firestore_tier) == 2
+
+
+@pytest.mark.asyncio
+async def test_deleting_a_conversation_purges_its_transcripts():
+    client = local_store.LocalClient()
+    await _transcribe(client, PHONE, "m1")
+    await _transcribe(client, OTHER_PHONE, "m2")
+
+    assert firebase.delete_conversation(client, PHONE)
+    transcription_service.forget(PHONE)
+
+    assert {e["phone_number"] for e in _entries(client).values()} == {OTHER_PHONE}
+    assert {e["phone_number"] for e in transcription_service._cache.values()} == {
+        OTHER_PHONE
+    }
@@ -0,0 +1,163 @@
+import asyncio
+import functools
+
+import pytest
+
+import metrics
+from config import settings
+from database import firebase, local_store, write_behind
+from services import conversation_service
+
+PHONE = "5511999990000"
+KEY = f":{PHONE}"
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_TIMEOUT_SECONDS", 5)
+    metrics.reset()
+    yield
+    write_behind._inflight.clear()
+
+
+def _history(client) -> list[tuple[str, str]]:
+    data = firebase.conversation_ref(client, PHONE).get().to_dict() or {}
+    return [(m["role"], m["content"]) for m in data.get("history", [])]
+
+
+@pytest.mark.asyncio
+async def test_writes_for_a_key_run_in_submission_order():
+    client = local_store.LocalClient(latency=0.02)
+    write_behind.submit(
+        KEY, conversation_service._history_writes(client, PHONE, "first", "reply 1")
+    )
+    write_behind.submit(
+        KEY, conversation_service._history_writes(client, PHONE, "second", "reply 2")
+    )
+
+    assert await write_behind.flush() == 0
+    assert _history(client) == [
+        ("user", "first"),
+        ("assistant", "reply 1"),
+        ("user", "second"),
+        ("assistant", "reply 2"),
+    ]
+    assert metrics.get("write_behind.submitted") == 4
+    assert metrics.get("write_behind.completed") == 4
+
+
+@pytest.mark.asyncio
+async def test_wait_for_blocks_the_next_read_until_writes_land():
+    client = local_store.LocalClient(latency=0.05)
+    write_behind.submit(
+        KEY, conversation_service._history_writes(client, PHONE, "hello", "hi!")
+    )
+
+    await write_behind.wait_for(KEY)
+    conversation = await conversation_service.load_conversation(client, PHONE)
+
+    assert [(m.role, m.content) for m in conversation.history] == [
+        ("user", "hello"),
+        ("assistant", "hi!"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_wait_for_without_pending_writes_returns_immediately():
+    await asyncio.wait_for(write_behind.wait_for("nothing:queued"), timeout=0.1)
+
+
+@pytest.mark.asyncio
+async def test_failing_write_is_retried_then_counted_as_failed(monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_ATTEMPTS", 2)
+    attempts = []
+
+    def write():
+        attempts.append(1)
+        return False
+
+    write_behind.submit(KEY, [write])
+    await write_behind.flush()
+
+    assert len(attempts) == 2
+    assert metrics.get("write_behind.retries") == 1
+    assert metrics.get("write_behind.failed") == 1
+    assert metrics.get("write_behind.completed") == 0
+
+
+@pytest.mark.asyncio
+async def test_later_writes_still_run_after_one_gives_up(monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_ATTEMPTS", 1)
+    client = local_store.LocalClient()
+    writes = [lambda: False] + conversation_service._history_writes(
+        client, PHONE, "hello", "hi!"
+    )
+
+    write_behind.submit(KEY, writes)
+    await write_behind.flush()
+
+    assert metrics.get("write_behind.failed") == 1
+    assert _history(client) == [("user", "hello"), ("assistant", "hi!")]
+
+
+@pytest.mark.asyncio
+async def test_retry_after_a_committed_attempt_does_not_duplicate():
+    client = local_store.LocalClient()
+    save_user, save_reply = conversation_service._history_writes(
+        client, PHONE, "hello", "hi!"
+    )
+    rating = conversation_service._rating_write(client, PHONE, 7, message_index=0)
+
+    def committed_then_timed_out(write):
+        # The write lands, but the client reports a timeout the first time.
+        calls = []
+
+        def _write():
+            write()
+            calls.append(1)
+            if len(calls) == 1:
+                raise TimeoutError("deadline exceeded waiting for commit")
+            return True
+
+        return _write
+
+    write_behind.submit(
+        KEY,
+        [committed_then_timed_out(w) for w in (save_user, save_reply, rating)],
+    )
+    await write_behind.flush()
+
+    data = firebase.conversation_ref(client, PHONE).get().to_dict()
+    assert [(m["role"], m["content"]) for m in data["history"]] == [
+        ("user", "hello"),
+        ("assistant", "hi!"),
+    ]
+    assert [r["score"] for r in data["feeling_array"]] == [7]
+    assert metrics.get("write_behind.retries") == 3
+    assert metrics.get("write_behind.failed") == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_waits_for_every_key():
+    client = local_store.LocalClient(latency=0.02)
+    for phone in ("5511000000001", "5511000000002", "5511000000003"):
+        write_behind.submit(
+            f":{phone}",
+            [functools.partial(firebase.save_message, client, phone, "hello")],
+        )
+
+    assert await write_behind.flush() == 0
+    assert write_behind._inflight == {}
+    assert metrics.get("write_behind.completed") == 3
+
+
+@pytest.mark.asyncio
+async def test_flush_reports_keys_still_pending_at_timeout():
+    client = local_store.LocalClient(latency=0.2)
+    write_behind.submit(
+        KEY, [functools.partial(firebase.save_message, client, PHONE, "hello")]
+    )
+
+    assert await write_behind.flush(timeout=0.01) == 1
+    assert await write_behind.flush() == 0
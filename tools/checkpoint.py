@@ -0,0 +1,22 @@
+"""JSON checkpoint files so long-running tools can resume after interruption."""
+
+import json
+import os
+
+
+def load(path: str | None, default: dict) -> dict:
+    """Return the checkpoint saved at `path`, or a copy of `default`."""
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return dict(default)
+
+
+def save(path: str | None, checkpoint: dict):
+    """Atomically replace the checkpoint at `path` (no-op without a path)."""
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
@@ -0,0 +1,367 @@
+"""Delete or update a cohort of conversations in bulk.
+
+Run from project root:
+    python -m tools.cohort_admin delete --variant PT_prompt_A_control_condition --dry-run
+    python -m tools.cohort_admin delete --updated-before 2026-03-01 --phase awaiting_initial_rating
+    python -m tools.cohort_admin set-language EN --language PT --namespace arm_b
+    python -m tools.cohort_admin set-phase normal --phase awaiting_check_in_rating
+    python -m tools.cohort_admin delete --language PT --local pilot.json
+
+A cohort is every conversation matching all of --variant, --language, --phase
+and the --updated-after/--updated-before range (UTC unless the timestamp says
+otherwise). Equality filters run in Firestore; the updated_at range is checked
+on each page so the scan keeps plain document-ID order and needs no composite
+index.
+
+Writes go through Firestore's BulkWriter (batched, retried, capped at
+--max-per-second so live traffic isn't starved). Progress is checkpointed after
+each page has been written, so an interrupted run resumes where it stopped
+(pass --restart to scan from the beginning); the checkpoint is removed once a
+run completes. Writes that still fail after --max-attempts are logged and
+counted, and the exit status is 1; running the command again retries them.
+
+`delete` also removes the users' entries in the shared voice-note transcript
+cache. --dry-run writes nothing and reports how many conversations match.
+--local PATH runs against a JSON-file local store (database/local_store.py)
+instead of Firestore, for trying a command out.
+"""
+
+import argparse
+import dataclasses
+import datetime as dt
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Callable
+
+from google.api_core import exceptions
+from google.cloud import firestore
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
+
+from database import firebase, local_store
+from tools import checkpoint as checkpoints
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("awaiting_initial_rating", "normal", "awaiting_check_in_rating")
+
+_FAILED_PRECONDITION = exceptions.FailedPrecondition.grpc_status_code.value[0]
+
+
+@dataclasses.dataclass
+class Selection:
+    prompt_variant: str | None = None
+    language: str | None = None
+    conversation_phase: str | None = None
+    updated_after: dt.datetime | None = None
+    updated_before: dt.datetime | None = None
+
+    def query(self, collection):
+        """`collection` filtered on the equality fields that are set."""
+        query = collection
+        for field in ("prompt_variant", "language", "conversation_phase"):
+            value = getattr(self, field)
+            if value is not None:
+                query = query.where(filter=firestore.FieldFilter(field, "==", value))
+        return query
+
+    def matches(self, data: dict) -> bool:
+        """Check the updated_at range, which query() leaves out."""
+        if self.updated_after is None and self.updated_before is None:
+            return True
+        updated_at = data.get("updated_at")
+        if updated_at is None:
+            return False
+        updated_at = _as_utc(updated_at)
+        if self.updated_after is not None and updated_at < self.updated_after:
+            return False
+        if self.updated_before is not None and updated_at >= self.updated_before:
+            return False
+        return True
+
+    def describe(self) -> dict:
+        return {
+            field.name: (value.isoformat() if isinstance(value, dt.datetime) else value)
+            for field in dataclasses.fields(self)
+            if (value := getattr(self, field.name)) is not None
+        }
+
+
+class WriteFailures:
+    """BulkWriter on_write_error callback that gives up after `max_attempts`.
+
+    Paths of writes that still failed are logged and kept for take(). A write
+    whose precondition failed (the document changed since it was read) is
+    not retried and is kept separately as a conflict.
+    """
+
+    def __init__(self, max_attempts: int):
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._failed: list[str] = []
+        self._conflicts: list[str] = []
+
+    # Called from BulkWriter's worker threads.
+    def __call__(self, failure, _writer) -> bool:
+        path = failure.operation.reference.path
+        if failure.code == _FAILED_PRECONDITION:
+            with self._lock:
+                self._conflicts.append(path)
+            return False
+        if failure.attempts < self.max_attempts:
+            return True
+        with self._lock:
+            self._failed.append(path)
+        logger.error(
+            "Giving up on %s after %s attempts: %s",
+            path,
+            failure.attempts,
+            failure.message,
+        )
+        return False
+
+    def take(self) -> tuple[list[str], list[str]]:
+        """(failed, conflicting) paths recorded since the last call."""
+        with self._lock:
+            failed, self._failed = self._failed, []
+            conflicts, self._conflicts = self._conflicts, []
+        return failed, conflicts
+
+
+def open_bulk_writer(client, max_per_second: float, max_attempts: int):
+    """A BulkWriter capped at `max_per_second`, and its WriteFailures."""
+    ops_per_second = max(1, int(max_per_second))
+    writer = client.bulk_writer(
+        BulkWriterOptions(
+            initial_ops_per_second=min(ops_per_second, 500),
+            max_ops_per_second=ops_per_second,
+        )
+    )
+    failures = WriteFailures(max_attempts)
+    writer.on_write_error(failures)
+    return writer, failures
+
+
+# An operation queues the writes for one matching document on the bulk writer.
+Operation = Callable[[object, object], None]
+
+
+def delete_op(client) -> Operation:
+    """Delete the conversation and the user's cached voice-note transcripts."""
+
+    def _op(writer, doc):
+        writer.delete(doc.reference)
+        phone_number = doc.to_dict().get("phone_number")
+        if not phone_number:
+            phone_number = firebase.phone_number_from_doc_id(doc.id)
+        for entry in firebase.cached_transcripts_query(client, phone_number).stream():
+            writer.delete(entry.reference)
+
+    return _op
+
+
+def set_language_op(language: str) -> Operation:
+    """Switch language and the prompt variant with it, like the /lang command."""
+
+    def _op(writer, doc):
+        variant = doc.to_dict().get("prompt_variant", "")
+        update = {"language": language, "updated_at": dt.datetime.now()}
+        if "_prompt_" in variant:
+            base = variant.split("_prompt_", 1)[1]
+            update["prompt_variant"] = f"{language}_prompt_{base}"
+        writer.update(doc.reference, update)
+
+    return _op
+
+
+def set_phase_op(phase: str) -> Operation:
+    def _op(writer, doc):
+        writer.update(
+            doc.reference,
+            {"conversation_phase": phase, "updated_at": dt.datetime.now()},
+        )
+
+    return _op
+
+
+def run(
+    client,
+    selection: Selection,
+    operation: Operation,
+    job: str,
+    checkpoint_path: str | None = None,
+    page_size: int = 200,
+    max_per_second: int = 100,
+    max_attempts: int = 5,
+    dry_run: bool = False,
+) -> dict:
+    """Apply `operation` to every conversation in `selection`.
+
+    `job` names the operation and selection; a checkpoint written for a
+    different job is refused rather than resumed. Returns the final
+    checkpoint: {"job", "last_doc_id", "scanned", "matched", "failed"}.
+    In dry-run mode nothing is written and "matched" is the cohort size.
+    """
+    start = {"job": job, "last_doc_id": None, "scanned": 0, "matched": 0, "failed": 0}
+    checkpoint = checkpoints.load(checkpoint_path, start) if not dry_run else start
+    if checkpoint["job"] != job:
+        raise ValueError(
+            f"Checkpoint {checkpoint_path} belongs to {checkpoint['job']!r}; "
+            "pass --restart to discard it"
+        )
+
+    writer = failures = None
+    if not dry_run:
+        writer, failures = open_bulk_writer(client, max_per_second, max_attempts)
+
+    base = selection.query(client.collection("conversations"))
+    while True:
+        query = base.order_by("__name__").limit(page_size)
+        if checkpoint["last_doc_id"] is not None:
+            query = query.start_after({"__name__": checkpoint["last_doc_id"]})
+        page = list(query.stream())
+        if not page:
+            break
+
+        for doc in page:
+            checkpoint["scanned"] += 1
+            if not selection.matches(doc.to_dict()):
+                continue
+            checkpoint["matched"] += 1
+            if writer is not None:
+                operation(writer, doc)
+
+        checkpoint["last_doc_id"] = page[-1].id
+        if writer is not None:
+            # Only checkpoint writes that have actually been sent.
+            writer.flush()
+            failed, _ = failures.take()
+            checkpoint["failed"] += len(failed)
+            checkpoints.save(checkpoint_path, checkpoint)
+        logger.info(
+            "Scanned %s documents, %s %s, %s failed",
+            checkpoint["scanned"],
+            checkpoint["matched"],
+            "match" if dry_run else "written",
+            checkpoint["failed"],
+        )
+
+    if writer is not None:
+        writer.close()
+    return checkpoint
+
+
+def _as_utc(value: dt.datetime) -> dt.datetime:
+    # Firestore stores naive datetimes as UTC.
+    return value if value.tzinfo else value.replace(tzinfo=dt.timezone.utc)
+
+
+def parse_timestamp(value: str) -> dt.datetime:
+    try:
+        return _as_utc(dt.datetime.fromisoformat(value))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not an ISO 8601 timestamp: {value!r}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m tools.cohort_admin",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    delete = commands.add_parser("delete", help="delete matching conversations")
+    set_language = commands.add_parser(
+        "set-language", help="switch language (and prompt variant)"
+    )
+    set_language.add_argument("value", choices=["EN", "PT"])
+    set_phase = commands.add_parser("set-phase", help="move to a conversation phase")
+    set_phase.add_argument("value", choices=PHASES)
+
+    for command in (delete, set_language, set_phase):
+        command.add_argument("--variant", help="prompt_variant, e.g. PT_prompt_A_...")
+        command.add_argument("--language", choices=["EN", "PT"])
+        command.add_argument("--phase", choices=PHASES)
+        command.add_argument("--updated-after", type=parse_timestamp, metavar="ISO")
+        command.add_argument("--updated-before", type=parse_timestamp, metavar="ISO")
+        command.add_argument(
+            "--namespace", default="", help="Firestore namespace to operate on"
+        )
+        command.add_argument("--checkpoint", default="cohort_admin.checkpoint.json")
+        command.add_argument(
+            "--restart", action="store_true", help="ignore the checkpoint"
+        )
+        command.add_argument("--page-size", type=int, default=200)
+        command.add_argument("--max-per-second", type=int, default=100)
+        command.add_argument("--max-attempts", type=int, default=5)
+        command.add_argument("--dry-run", action="store_true")
+        command.add_argument(
+            "--local", metavar="PATH", help="use a JSON-file local store"
+        )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s %(message)s")
+    selection = Selection(
+        prompt_variant=args.variant,
+        language=args.language,
+        conversation_phase=args.phase,
+        updated_after=args.updated_after,
+        updated_before=args.updated_before,
+    )
+    if not selection.describe():
+        parser.error(
+            "select a cohort (use --updated-before with a future date for all)"
+        )
+
+    base = (
+        local_store.LocalClient.load(args.local)
+        if args.local
+        else firebase.init_firestore()
+    )
+    client = firebase.namespaced(base, args.namespace)
+    if args.command == "delete":
+        operation = delete_op(client)
+    elif args.command == "set-language":
+        operation = set_language_op(args.value)
+    else:
+        operation = set_phase_op(args.value)
+    job = json.dumps(
+        {
+            "command": args.command,
+            "value": getattr(args, "value", None),
+            "namespace": args.namespace,
+            **selection.describe(),
+        },
+        sort_keys=True,
+    )
+
+    checkpoint_path = args.checkpoint
+    if args.namespace:
+        checkpoint_path = f"{args.namespace}.{checkpoint_path}"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    try:
+        result = run(
+            client,
+            selection,
+            operation,
+            job,
+            checkpoint_path=checkpoint_path,
+            page_size=args.page_size,
+            max_per_second=args.max_per_second,
+            max_attempts=args.max_attempts,
+            dry_run=args.dry_run,
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+    if not args.dry_run and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    print(json.dumps(result))
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
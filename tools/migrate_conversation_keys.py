@@ -0,0 +1,123 @@
+"""Move conversations from raw phone-number document IDs to hashed IDs.
+
+Run from project root:
+    python -m tools.migrate_conversation_keys --dry-run
+    python -m tools.migrate_conversation_keys
+    python -m tools.migrate_conversation_keys --namespace arm_b
+
+Safe to run while the bot is serving traffic: each document is moved in its
+own transaction (see firebase.migrate_conversation_key), and conversations
+touched by users in the meantime are migrated on read anyway (unless
+CONVERSATION_KEY_MIGRATE_ON_READ is off). Progress is
+checkpointed after every page, so an interrupted run resumes where it
+stopped; pass --restart to scan from the beginning.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from config import settings
+from database import firebase
+from tools import checkpoint as checkpoints
+
+logger = logging.getLogger(__name__)
+
+_START = {"last_doc_id": None, "scanned": 0, "migrated": 0}
+
+
+def migrate(
+    client,
+    checkpoint_path: str | None = None,
+    page_size: int = 200,
+    max_per_second: float = 50,
+    dry_run: bool = False,
+) -> dict:
+    """Scan 'conversations' in document-ID order and migrate legacy IDs.
+
+    Returns the final checkpoint: {"last_doc_id", "scanned", "migrated"}.
+    In dry-run mode nothing is written and "migrated" counts what would be.
+    """
+    if settings.CONVERSATION_KEY_SCHEME == "raw":
+        raise ValueError("CONVERSATION_KEY_SCHEME is 'raw'; nothing to migrate to")
+
+    checkpoint = (
+        checkpoints.load(checkpoint_path, _START) if not dry_run else dict(_START)
+    )
+    collection = client.collection("conversations")
+    min_interval = 1 / max_per_second if max_per_second > 0 else 0
+
+    while True:
+        query = collection.order_by("__name__").limit(page_size)
+        if checkpoint["last_doc_id"] is not None:
+            query = query.start_after({"__name__": checkpoint["last_doc_id"]})
+        page = list(query.stream())
+        if not page:
+            break
+
+        for doc in page:
+            checkpoint["scanned"] += 1
+            if not firebase.is_legacy_doc_id(doc.id):
+                continue
+            if dry_run:
+                checkpoint["migrated"] += 1
+                continue
+            started = time.monotonic()
+            if firebase.migrate_conversation_key(client, doc.id):
+                checkpoint["migrated"] += 1
+            # Throttle so a big backfill doesn't compete with live traffic.
+            time.sleep(max(0.0, min_interval - (time.monotonic() - started)))
+
+        checkpoint["last_doc_id"] = page[-1].id
+        if not dry_run:
+            checkpoints.save(checkpoint_path, checkpoint)
+        logger.info(
+            "Scanned %s documents, %s %s",
+            checkpoint["scanned"],
+            checkpoint["migrated"],
+            "to migrate" if dry_run else "migrated",
+        )
+
+    return checkpoint
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m tools.migrate_conversation_keys", description=__doc__
+    )
+    parser.add_argument(
+        "--namespace", default="", help="Firestore namespace to migrate"
+    )
+    parser.add_argument(
+        "--checkpoint", default="migrate_conversation_keys.checkpoint.json"
+    )
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--max-per-second", type=float, default=50)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s %(message)s")
+    checkpoint_path = args.checkpoint
+    if args.namespace:
+        checkpoint_path = f"{args.namespace}.{checkpoint_path}"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    client = firebase.namespaced(firebase.init_firestore(), args.namespace)
+    result = migrate(
+        client,
+        checkpoint_path=checkpoint_path,
+        page_size=args.page_size,
+        max_per_second=args.max_per_second,
+        dry_run=args.dry_run,
+    )
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
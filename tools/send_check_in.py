@@ -0,0 +1,217 @@
+"""Send a trust check-in to a cohort of users (re-engagement campaign).
+
+Run from project root, e.g. from a scheduler:
+    python -m tools.send_check_in --dry-run
+    python -m tools.send_check_in --variant PT_prompt_C_perspective
+    python -m tools.send_check_in --updated-before 2026-03-01 --phone-number-id 1234
+
+Only conversations in the "normal" phase are selected; --variant, --language
+and the --updated-after/--updated-before range narrow that further, as in
+tools.cohort_admin. Each page of recipients is sent in one batch (shared
+connection pool, --max-concurrency in flight, at most --max-per-second).
+
+Conversations updated in the last --min-idle-minutes (default 10) are left
+out, since a turn may still be in flight for them.
+
+Recipients are moved to "awaiting_check_in_rating" *before* the batch is sent,
+with a follow-up question stored as their pending response (the reply to
+their rating) and check_in_source "campaign" (recorded on the rating). That
+update is conditional on the document being unchanged since it was read, so
+it can't race a reply the bot is writing; conversations that changed are
+skipped. Recipients the Graph API didn't accept are moved back to "normal"
+afterwards. So re-running after an interruption never sends anyone a second
+check-in: it skips everyone already marked. If the run dies between marking
+and sending, those users get the check-in prompt with their next message
+instead.
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import datetime as dt
+import json
+import logging
+import sys
+
+from google.cloud import firestore
+
+from database import firebase
+from services import check_in_campaign, number_registry
+from tools.cohort_admin import Selection, open_bulk_writer, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+def run(
+    client,
+    number: number_registry.WhatsAppNumber,
+    selection: Selection,
+    page_size: int = 200,
+    max_concurrency: int = 10,
+    max_per_second: float = 50,
+    min_idle: dt.timedelta = dt.timedelta(minutes=10),
+    max_attempts: int = 5,
+    dry_run: bool = False,
+) -> dict:
+    """Send the check-in to every idle "normal" conversation in `selection`.
+
+    Returns {"matched", "skipped", "sent", "failed"}, where "skipped" counts
+    conversations that changed between the scan and the update. In dry-run
+    mode nothing is sent and "matched" is the number of recipients.
+    """
+    idle_before = dt.datetime.now(dt.timezone.utc) - min_idle
+    if selection.updated_before is not None:
+        idle_before = min(idle_before, selection.updated_before)
+    selection = dataclasses.replace(
+        selection, conversation_phase="normal", updated_before=idle_before
+    )
+    base = selection.query(client.collection("conversations"))
+    totals = {"matched": 0, "skipped": 0, "sent": 0, "failed": 0}
+    last_doc_id = None
+
+    while True:
+        query = base.order_by("__name__").limit(page_size)
+        if last_doc_id is not None:
+            query = query.start_after({"__name__": last_doc_id})
+        page = list(query.stream())
+        if not page:
+            break
+        last_doc_id = page[-1].id
+
+        recipients = {}
+        for doc in page:
+            data = doc.to_dict()
+            if not selection.matches(data):
+                continue
+            phone_number = data.get("phone_number")
+            if not phone_number:
+                phone_number = firebase.phone_number_from_doc_id(doc.id)
+            recipients[phone_number] = (doc, data.get("language", "PT"))
+        totals["matched"] += len(recipients)
+        if dry_run or not recipients:
+            continue
+
+        # Mark before sending, so a re-run can't send anyone a second check-in,
+        # and only if nothing (e.g. a reply's write-behind) touched it since.
+        writer, failures = open_bulk_writer(client, max_per_second, max_attempts)
+        marked_at = dt.datetime.now()
+        for doc, language in recipients.values():
+            writer.update(
+                doc.reference,
+                {
+                    "conversation_phase": "awaiting_check_in_rating",
+                    "pending_ai_response": check_in_campaign.follow_up(language),
+                    "check_in_source": "campaign",
+                    "updated_at": marked_at,
+                },
+                option=client.write_option(last_update_time=doc.update_time),
+            )
+        writer.close()
+        failed, conflicts = failures.take()
+        unmarked = set(failed) | set(conflicts)
+        marked = {
+            phone: (doc.reference, language)
+            for phone, (doc, language) in recipients.items()
+            if doc.reference.path not in unmarked
+        }
+
+        sent = asyncio.run(
+            check_in_campaign.send_batch(
+                number,
+                [(phone, language) for phone, (_, language) in marked.items()],
+                max_concurrency=max_concurrency,
+                max_per_second=max_per_second,
+            )
+        )
+        unsent = marked.keys() - set(sent)
+        if unsent:
+            writer, failures = open_bulk_writer(client, max_per_second, max_attempts)
+            for phone_number in unsent:
+                writer.update(
+                    marked[phone_number][0],
+                    {
+                        "conversation_phase": "normal",
+                        "pending_ai_response": "",
+                        "check_in_source": firestore.DELETE_FIELD,
+                        "updated_at": dt.datetime.now(),
+                    },
+                )
+            writer.close()
+            for path in failures.take()[0]:
+                logger.error("Could not move %s back to normal", path)
+
+        totals["skipped"] += len(conflicts)
+        totals["sent"] += len(sent)
+        totals["failed"] += len(recipients) - len(conflicts) - len(sent)
+        logger.info(
+            "Check-in sent to %s of %s recipients so far, %s skipped, %s failed",
+            totals["sent"],
+            totals["matched"],
+            totals["skipped"],
+            totals["failed"],
+        )
+
+    return totals
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m tools.send_check_in",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--phone-number-id",
+        help="number to send from (default: the only configured number)",
+    )
+    parser.add_argument("--variant", help="prompt_variant, e.g. PT_prompt_A_...")
+    parser.add_argument("--language", choices=["EN", "PT"])
+    parser.add_argument("--updated-after", type=parse_timestamp, metavar="ISO")
+    parser.add_argument("--updated-before", type=parse_timestamp, metavar="ISO")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--max-concurrency", type=int, default=10)
+    parser.add_argument("--max-per-second", type=float, default=50)
+    parser.add_argument(
+        "--min-idle-minutes",
+        type=float,
+        default=10,
+        help="skip conversations updated more recently than this",
+    )
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s %(message)s")
+    numbers = number_registry.load()
+    if args.phone_number_id:
+        number = numbers.get(args.phone_number_id)
+        if number is None:
+            parser.error(f"unknown --phone-number-id {args.phone_number_id}")
+    elif len(numbers) == 1:
+        (number,) = numbers.values()
+    else:
+        parser.error("several numbers are configured; pass --phone-number-id")
+
+    client = firebase.namespaced(firebase.init_firestore(), number.firestore_namespace)
+    result = run(
+        client,
+        number,
+        Selection(
+            prompt_variant=args.variant,
+            language=args.language,
+            updated_after=args.updated_after,
+            updated_before=args.updated_before,
+        ),
+        page_size=args.page_size,
+        max_concurrency=args.max_concurrency,
+        max_per_second=args.max_per_second,
+        min_idle=dt.timedelta(minutes=args.min_idle_minutes),
+        max_attempts=args.max_attempts,
+        dry_run=args.dry_run,
+    )
+    print(json.dumps(result))
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())